@@ -0,0 +1,214 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+from corrections import USABLE_CAPACITY
+from dates import PARIS_TZ, format_dates
+from storage import DB_PATH, connect
+
+# périodes agrégées et format de leur clé (date locale de début de charge)
+PERIODS = {
+    "day": "%Y-%m-%d",
+    "week": "%G-W%V",
+    "month": "%Y-%m",
+}
+# fenêtres glissantes (en jours) de la consommation, de la plus courte à la plus longue
+CONSUMPTION_WINDOWS = [30, 90, 365]
+MIN_DISTANCE = 50 # km parcourus en dessous desquels une fenêtre ne donne pas de consommation fiable
+# tranches de puissance de charge : (borne haute en kW, libellé)
+POWER_BANDS = [
+    (3.7, "≤ 3,7 kW (prise domestique)"),
+    (7.4, "3,7 - 7,4 kW (wallbox)"),
+    (22.0, "7,4 - 22 kW (borne AC)"),
+    (float("inf"), "> 22 kW (borne rapide DC)"),
+]
+
+class AnalyticsStore:
+    """
+    Agrégats de consommation tenus à jour au fil des synchronisations : énergie rechargée par
+    jour / semaine / mois et par tranche de puissance. Chaque charge connue est mémorisée avec sa
+    contribution : une charge nouvelle ou modifiée ne met à jour que ses propres agrégats, sans
+    relire l'historique complet.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self._db = connect(path)
+        self._lock = threading.Lock()
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS analytics_charges (
+                vin TEXT NOT NULL,
+                chargeStartDate TEXT NOT NULL,
+                fakeCharge INTEGER NOT NULL,
+                energy REAL NOT NULL,
+                duration INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                week TEXT NOT NULL,
+                month TEXT NOT NULL,
+                band TEXT NOT NULL,
+                PRIMARY KEY (vin, chargeStartDate, fakeCharge)
+            );
+            CREATE TABLE IF NOT EXISTS analytics_energy (
+                vin TEXT NOT NULL,
+                period TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                energy REAL NOT NULL,
+                charges INTEGER NOT NULL,
+                PRIMARY KEY (vin, period, bucket)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS analytics_power (
+                vin TEXT NOT NULL,
+                band TEXT NOT NULL,
+                energy REAL NOT NULL,
+                duration INTEGER NOT NULL,
+                charges INTEGER NOT NULL,
+                PRIMARY KEY (vin, band)
+            ) WITHOUT ROWID;
+        """)
+        self._db.commit()
+
+    def has_charges(self, vin):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM analytics_charges WHERE vin = ? LIMIT 1", (vin,)).fetchone() is not None
+
+    def update(self, vin, charges, since=None):
+        """
+        Intègre des charges corrigées et typées (voir models.to_charge_frame) aux agrégats.
+        'since' (datetime) indique la fenêtre synchronisée : les charges déjà comptées à partir
+        de cette date et absentes de 'charges' (ex. charge ajoutée remplacée) sont retirées.
+        Retourne le nombre de charges dont la contribution a changé.
+        """
+        rows = {}
+        if not charges.empty:
+            keys = charges['chargeStartDate'].dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+            buckets = {period: format_dates(charges['chargeStartDate'], fmt) for period, fmt in PERIODS.items()}
+            for i, key in enumerate(keys):
+                fake = int(charges['fakeCharge'].iat[i])
+                rows[(key, fake)] = (
+                    float(charges['chargeEnergyRecovered'].iat[i]),
+                    int(charges['chargeDuration'].iat[i]),
+                    buckets["day"].iat[i],
+                    buckets["week"].iat[i],
+                    buckets["month"].iat[i],
+                    power_band(float(charges['chargePower'].iat[i])),
+                )
+
+        changed = 0
+        with self._lock:
+            if since is not None:
+                known = self._db.execute(
+                    "SELECT chargeStartDate, fakeCharge FROM analytics_charges WHERE vin = ? AND chargeStartDate >= ?",
+                    (vin, since.strftime("%Y-%m-%dT%H:%M:%SZ")),
+                ).fetchall()
+                for key in known:
+                    if key not in rows:
+                        self._remove(vin, key)
+                        changed += 1
+            for key, row in rows.items():
+                old = self._db.execute(
+                    "SELECT energy, duration, day, week, month, band FROM analytics_charges "
+                    "WHERE vin = ? AND chargeStartDate = ? AND fakeCharge = ?", (vin, *key)
+                ).fetchone()
+                if old is not None and _same(old, row):
+                    continue
+                if old is not None:
+                    self._remove(vin, key)
+                self._add(vin, key, row)
+                changed += 1
+            self._db.commit()
+        return changed
+
+    def energy(self, vin, period="month", start=None):
+        """Énergie rechargée (kWh) et nombre de charges par période, à partir de la clé 'start' incluse."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT bucket, energy, charges FROM analytics_energy WHERE vin = ? AND period = ? AND bucket >= ? "
+                "ORDER BY bucket", (vin, period, start or "")
+            ).fetchall()
+        return pd.DataFrame(rows, columns=["bucket", "energy", "charges"]).set_index("bucket")
+
+    def power_bands(self, vin):
+        """Énergie, durée (h), nombre de charges et puissance moyenne (kW) par tranche de puissance."""
+        with self._lock:
+            rows = dict((band, values) for band, *values in self._db.execute(
+                "SELECT band, energy, duration, charges FROM analytics_power WHERE vin = ?", (vin,)
+            ))
+        data = []
+        for _, label in POWER_BANDS:
+            if label in rows:
+                energy, duration, charges = rows[label]
+                hours = duration / 60
+                data.append((label, energy, hours, charges, energy / hours if hours else None))
+        return pd.DataFrame(data, columns=["band", "energy", "hours", "charges", "avg_power"]).set_index("band")
+
+    def consumption(self, vin, telemetry, now=None, windows=CONSUMPTION_WINDOWS, capacity=USABLE_CAPACITY):
+        """
+        Consommation moyenne (kWh/100km) sur la plus courte fenêtre glissante où l'on a roulé au moins
+        MIN_DISTANCE km : énergie rechargée dans la fenêtre, corrigée de la variation du niveau de batterie,
+        rapportée aux kilomètres relevés par le cockpit (voir telemetry.TelemetryStore).
+        Retourne (kWh/100km, nombre de jours de la fenêtre), ou (None, None) faute de relevés suffisants.
+        """
+        now = now or datetime.now(timezone.utc)
+        last = telemetry.reading_at("cockpit", vin, now)
+        if last is None:
+            return None, None
+        end_time, end_values = last
+        for days in windows:
+            first = telemetry.reading_at("cockpit", vin, now - timedelta(days=days))
+            start_time, start_values = first
+            distance = end_values["mileage"] - start_values["mileage"]
+            if distance < MIN_DISTANCE:
+                continue
+            start_day = start_time.astimezone(PARIS_TZ).strftime(PERIODS["day"])
+            with self._lock:
+                energy = self._db.execute(
+                    "SELECT COALESCE(SUM(energy), 0) FROM analytics_energy WHERE vin = ? AND period = 'day' AND bucket >= ?",
+                    (vin, start_day),
+                ).fetchone()[0]
+            # l'énergie rechargée mais pas encore consommée (ou l'inverse) se lit dans le niveau de batterie
+            level_start = telemetry.reading_at("battery", vin, start_time)
+            level_end = telemetry.reading_at("battery", vin, end_time)
+            if level_start is not None and level_end is not None:
+                start_level = level_start[1]["battery_level"]
+                end_level = level_end[1]["battery_level"]
+                if start_level is not None and end_level is not None:
+                    energy += (start_level - end_level) / 100 * capacity
+            if energy <= 0:
+                continue
+            return round(energy / distance * 100, 2), days
+        return None, None
+
+    def _add(self, vin, key, row, sign=1):
+        energy, duration, day, week, month, band = row
+        for period, bucket in zip(PERIODS, (day, week, month)):
+            self._db.execute("""
+                INSERT INTO analytics_energy VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (vin, period, bucket) DO UPDATE SET energy = energy + excluded.energy, charges = charges + excluded.charges
+            """, (vin, period, bucket, sign * energy, sign))
+        self._db.execute("""
+            INSERT INTO analytics_power VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (vin, band) DO UPDATE SET energy = energy + excluded.energy, duration = duration + excluded.duration,
+                charges = charges + excluded.charges
+        """, (vin, band, sign * energy, sign * duration, sign))
+        if sign > 0:
+            self._db.execute("INSERT INTO analytics_charges VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (vin, *key, *row))
+
+    def _remove(self, vin, key):
+        old = self._db.execute(
+            "SELECT energy, duration, day, week, month, band FROM analytics_charges "
+            "WHERE vin = ? AND chargeStartDate = ? AND fakeCharge = ?", (vin, *key)
+        ).fetchone()
+        self._add(vin, key, old, sign=-1)
+        self._db.execute(
+            "DELETE FROM analytics_charges WHERE vin = ? AND chargeStartDate = ? AND fakeCharge = ?", (vin, *key)
+        )
+
+def power_band(power):
+    """Libellé de la tranche de puissance (kW) d'une charge."""
+    for upper, label in POWER_BANDS:
+        if power <= upper:
+            return label
+    return POWER_BANDS[-1][1]
+
+def _same(old, row):
+    return abs(old[0] - row[0]) < 1e-6 and tuple(old[1:]) == tuple(row[1:])
@@ -1,9 +1,17 @@
+import logging
+import os
 import streamlit as st
-import pandas as pd
-import asyncio
-from main import get_renault_data  # import de la fonction async
-from main import format_date
-import pytz
+from dates import format_date
+from metrics import METRICS, span
+from snapshot import SNAPSHOT_PATH, read_snapshot
+# Les modules lourds (pandas, aiohttp, renault_api) ne sont importés qu'une fois des données
+# à afficher ou à récupérer : le formulaire de connexion s'affiche sans les charger.
+
+# Journalisation : WARNING par défaut, MYR5_LOG_LEVEL=DEBUG pour le détail de chaque récupération
+logging.basicConfig(level=os.environ.get("MYR5_LOG_LEVEL", "WARNING").upper())
+
+# Mode serveur : les récupérations sont confiées à server.py, l'interface n'est plus qu'un client
+SERVER_URL = os.environ.get("MYR5_SERVER_URL")
 
 def get_secret_creds():
     """Retourne {'email':..., 'password':...} si présents dans st.secrets, sinon None."""
@@ -47,48 +55,167 @@ if "password" not in st.session_state:
     st.session_state.password = ""
 
 # -------------------------------------------------------------------------
-# Sidebar : secrets si présents, sinon formulaire
+# Ressources conservées d'une réexécution du script à l'autre
 # -------------------------------------------------------------------------
-st.sidebar.header("🔑 Connexion MyRenault")
+@st.cache_resource(show_spinner=False)
+def session_module():
+    """Import différé de la couche de récupération (aiohttp, renault_api, pandas), une fois par processus."""
+    import session
+    return session
 
-secret_creds = get_secret_creds()
+def remote_data(email, password, force_refresh=False):
+    """
+    Données récupérées par le serveur partagé (MYR5_SERVER_URL) : la session s'y ouvre une fois,
+    puis les réexécutions ne présentent que le jeton. Un jeton expiré ou d'un autre compte est renouvelé.
+    """
+    from remote import RemoteError, RemoteSession
+
+    remote = st.session_state.get("remote")
+    if remote is None or remote.token is None or st.session_state.email != email:
+        remote = st.session_state.remote = RemoteSession(SERVER_URL, access_key=os.environ.get("MYR5_ACCESS_KEY"))
+        return remote.login(email, password)
+    try:
+        return remote.get_data(force_refresh=force_refresh)
+    except RemoteError as exc:
+        if exc.status != 401:
+            raise
+        return remote.login(email, password)
+
+@st.cache_resource(show_spinner=False)
+def asset_cache():
+    from assets import AssetCache
+    return AssetCache()
+
+def thumbnail(index, asset):
+    """Vignette locale du visuel (fichier, ou octets reçus du serveur en mode client), ou None si elle manque."""
+    from assets import THUMBNAIL_WIDTH
+
+    if not SERVER_URL:
+        return asset_cache().image_for(asset, THUMBNAIL_WIDTH)
+    # les vignettes reçues sont gardées pour la session : elles ne changent pas d'une réexécution à l'autre
+    thumbnails = st.session_state.setdefault("thumbnails", {})
+    key = (st.session_state.email, index)
+    if key not in thumbnails:
+        image = st.session_state.remote.thumbnail(index, THUMBNAIL_WIDTH)
+        if image is None:
+            return None
+        thumbnails[key] = image
+    return thumbnails[key]
+
+@st.cache_data(ttl=60, show_spinner=False)
+def local_battery_telemetry(vin, start, last_update):
+    # la requête sous-échantillonnée n'est rejouée qu'à l'arrivée d'un nouveau relevé (ou au plus
+    # une fois par minute), pas à chaque interaction
+    return session_module().get_shared_telemetry().query("battery", vin, start=start)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def local_charge_analytics(vin, nb_charges):
+    # 'nb_charges' fait partie de la clé : les agrégats sont relus dès qu'une charge arrive
+    analytics = session_module().get_shared_analytics()
+    return analytics.energy(vin, "month"), analytics.power_bands(vin)
+
+# En mode serveur, relevés et agrégats passent par l'API (et son contrôle du jeton) plutôt que
+# par la base locale, et ne sont pas mis dans le cache st.cache_data commun à tous les visiteurs
+def battery_telemetry(vin, start, last_update):
+    if SERVER_URL:
+        return st.session_state.remote.battery_telemetry(start)
+    return local_battery_telemetry(vin, start, last_update)
+
+def charge_analytics(vin, nb_charges):
+    if SERVER_URL:
+        return st.session_state.remote.charge_analytics()
+    return local_charge_analytics(vin, nb_charges)
 
-if secret_creds:
-    # Secrets présents : on n'affiche PAS le formulaire, juste un bouton
-    st.sidebar.info("Identifiants chargés depuis secrets.toml")
-    submit = True # st.sidebar.button("✅ Se connecter / Rafraîchir", use_container_width=True)
-    email = secret_creds["email"]
-    password = secret_creds["password"]
+# -------------------------------------------------------------------------
+# Instantané publié par poller.py : lecture seule, aucun appel à l'API
+# -------------------------------------------------------------------------
+@st.cache_data(show_spinner=False)
+def load_snapshot(path, mtime):
+    # 'mtime' fait partie de la clé du cache : on ne relit le fichier que s'il a été republié
+    return read_snapshot(path)
+
+snapshot = None
+snapshot_meta = {}
+# en mode serveur, chaque visiteur se connecte à son compte : l'instantané d'un compte n'est jamais affiché
+if not SERVER_URL and os.path.exists(SNAPSHOT_PATH):
+    snapshot = load_snapshot(SNAPSHOT_PATH, os.path.getmtime(SNAPSHOT_PATH))
+
+if snapshot is not None:
+    st.session_state.attrs, snapshot_meta = snapshot
+    st.sidebar.header("📡 Données publiées")
+    fetched_at = snapshot_meta.get("fetched_at")
+    st.sidebar.info(f"Instantané publié le {format_date(fetched_at) if fetched_at else '?'} par le poller")
 else:
-    # Pas de secrets → formulaire classique
-    with st.sidebar.form("login_form", clear_on_submit=False):
-        email = st.text_input("Email MyRenault", value=st.session_state.email)
-        password = st.text_input("Mot de passe", type="password", value=st.session_state.password)
-        submit = st.form_submit_button("✅ Se connecter / Rafraîchir")
-
-# === Fonction de refresh ===
-def refresh_data(email, password):
-    if email and password:
-        with st.spinner("Chargement des données Renault..."):
-            # get_renault_data doit être défini/importé dans ton code
-            st.session_state.attrs = asyncio.run(get_renault_data(email, password))
-            # Mémoriser (retire la ligne du password si tu préfères ne pas stocker)
-            st.session_state.email = email
-            st.session_state.password = password
+    # -------------------------------------------------------------------------
+    # Sidebar : secrets si présents, sinon formulaire
+    # -------------------------------------------------------------------------
+    st.sidebar.header("🔑 Connexion MyRenault")
+
+    # même règle pour les identifiants de secrets.toml, qui connecteraient tous les visiteurs au même compte
+    secret_creds = get_secret_creds() if not SERVER_URL else None
+
+    if secret_creds:
+        # Secrets présents : on n'affiche PAS le formulaire, juste un bouton
+        st.sidebar.info("Identifiants chargés depuis secrets.toml")
+        submit = True # st.sidebar.button("✅ Se connecter / Rafraîchir", use_container_width=True)
+        email = secret_creds["email"]
+        password = secret_creds["password"]
     else:
-        st.warning("Merci de renseigner vos identifiants.")
+        # Pas de secrets → formulaire classique
+        with st.sidebar.form("login_form", clear_on_submit=False):
+            email = st.text_input("Email MyRenault", value=st.session_state.email)
+            password = st.text_input("Mot de passe", type="password", value=st.session_state.password)
+            submit = st.form_submit_button("✅ Se connecter / Rafraîchir")
+
+    # Rafraîchissement forcé : ignore le cache des réponses de l'API
+    force_refresh = st.sidebar.button("🔄 Forcer le rafraîchissement", use_container_width=True)
+    if force_refresh:
+        submit = True
+
+    # === Fonction de refresh ===
+    def refresh_data(email, password, force_refresh=False):
+        has_token = SERVER_URL and st.session_state.get("remote") is not None and st.session_state.email == email
+        if email and (password or has_token):
+            with st.spinner("Chargement des données Renault..."):
+                # la session (connexion, compte, VIN) est conservée d'une réexécution à l'autre,
+                # et les endpoints encore frais sont servis depuis le cache
+                try:
+                    if SERVER_URL:
+                        st.session_state.attrs = remote_data(email, password, force_refresh)
+                    else:
+                        manager = session_module().get_session_manager(email, password)
+                        st.session_state.attrs = manager.get_data(force_refresh=force_refresh)
+                except Exception as exc:
+                    # connexion refusée ou API injoignable : on garde les dernières données affichées
+                    st.error(f"Récupération impossible ({type(exc).__name__}: {exc})")
+                    return
+                # Mémoriser (retire la ligne du password si tu préfères ne pas stocker)
+                st.session_state.email = email
+                if not SERVER_URL:
+                    # avec le serveur, seul son jeton est gardé dans la session du navigateur
+                    st.session_state.password = password
+        else:
+            st.warning("Merci de renseigner vos identifiants.")
+
+    # === Exécution quand on valide ===
+    if submit:
+        refresh_data(email, password, force_refresh=force_refresh)
 
-# === Exécution quand on valide ===
-if submit:
-    refresh_data(email, password)
+def n_d(value, unit=""):
+    """Valeur suivie de son unité, ou "n/d" si elle n'a pas pu être calculée."""
+    return f"{value}{unit}" if value is not None else "n/d"
 
 # === Utilisation des données ===
-attrs = st.session_state.attrs
-if attrs:
-    # st.write("🚗 Données Renault :", attrs)
+data = st.session_state.attrs
+if data:
+    attrs = data.state
 
     # === Bouton de refresh ===
-    st.write("Dernière mise à jour :", attrs['last_update'])
+    st.write("Dernière mise à jour :", format_date(attrs.last_update) if attrs.last_update else "inconnue")
+
+    # Sections indisponibles lors de la dernière récupération
+    for endpoint, error in data.errors.items():
+        st.warning(f"Données « {endpoint} » indisponibles : {error}")
     # st.button("🔄 Rafraîchir les données", on_click=refresh_data)
 
     # --- Création des onglets ---
@@ -97,150 +224,73 @@ if attrs:
     # --- Batterie ---
     with tab_info:
         st.subheader("🔋 État de la batterie")
-        usable_capacity = attrs['usable_capacity']
-        st.write("Niveau actuel", f"{attrs['battery_level']} % ({attrs['battery_level'] * usable_capacity / 100:.2f} kWh / {int(usable_capacity)} kWh)")
+        usable_capacity = attrs.usable_capacity
+        if attrs.battery_level is not None:
+            st.write("Niveau actuel", f"{attrs.battery_level} % ({attrs.battery_level * usable_capacity / 100:.2f} kWh / {int(usable_capacity)} kWh)")
+        else:
+            st.write("Niveau actuel", "indisponible")
 
         # --- Statistiques globales ---
         st.subheader("⚡ Statistiques globales")
-        charge_stats = attrs['charge_stats']
-        st.write(f"Énergie totale rechargée : {charge_stats['total_energy_charged']} kWh (en {charge_stats['nb_charges']} recharges)")
-        st.write(f"Kilométrage parcouru : {attrs['kilometrage']} km")
-        st.write(f"Consommation moyenne : {charge_stats['avg_consumption']} kWh/100km")
-        st.write(f"Autonomie restante officielle : {attrs['battery_autonomy']} km / {attrs['battery_max_autonomy']} km")
-        #st.write(f"Autonomie max officielle (100% charge) : {attrs['battery_max_autonomy']} km")
-        st.write(f"Autonomie restante recalculée avec conso moyenne : {attrs['battery_autonomy_estimation']} km / {attrs['battery_max_autonomy_real']} km")
-        #st.write(f"Autonomie max recalculée (100% charge) avec conso moyenne : {attrs['battery_max_autonomy_real']} km")
+        st.write(f"Énergie totale rechargée : {attrs.total_energy_charged} kWh (en {attrs.nb_charges} recharges)")
+        st.write(f"Kilométrage parcouru : {n_d(attrs.kilometrage, ' km')}")
+        st.write(f"Consommation moyenne : {n_d(attrs.avg_consumption, ' kWh/100km')}")
+        st.write(f"Autonomie restante officielle : {n_d(attrs.battery_autonomy, ' km')} / {n_d(attrs.battery_max_autonomy, ' km')}")
+        #st.write(f"Autonomie max officielle (100% charge) : {attrs.battery_max_autonomy} km")
+        st.write(f"Autonomie restante recalculée avec conso moyenne : {n_d(attrs.battery_autonomy_estimation, ' km')} / {n_d(attrs.battery_max_autonomy_real, ' km')}")
+        #st.write(f"Autonomie max recalculée (100% charge) avec conso moyenne : {attrs.battery_max_autonomy_real} km")
         
         # Branchée ?
-        if attrs['plugStatus'] == 1:
+        if attrs.plug_status is None:
+            st.write("❔ Branchement inconnu")
+        elif attrs.plug_status == 1:
             st.write("🔌 Branchée")
         else:
             st.write("❌ Débranchée")
 
         # En charge ?
-        if attrs['chargingStatus'] == 0.0:
+        if attrs.charging_status == 0.0:
             st.write("⏸️ Pas en charge")
-        elif attrs['chargingStatus'] == 0.1:
+        elif attrs.charging_status == 0.1:
             st.write("🕒 Charge planifiée")
-        elif attrs['chargingStatus'] == 1.0:#0.2
+        elif attrs.charging_status == 1.0:#0.2
             st.write("⚡ En charge")
 
         # Nombre de colonnes par ligne
         cols_count = 3
         cols = st.columns(cols_count)
 
-        # Parcourir les assets et leurs renditions
-        for i, asset in enumerate(attrs['assets']):
+        # Une image par point de vue : la vignette à la largeur de la colonne (voir assets.py), servie
+        # par le serveur en mode client, sinon la plus petite rendition du CDN le temps du téléchargement
+        from assets import smallest_rendition
+
+        for i, asset in enumerate(data.assets):
             viewpoint = asset["viewpoint"]
-            for rendition in asset["renditions"]:
-                url = rendition["url"]
-                resolutionType = rendition["resolutionType"]
-                caption = f"{viewpoint} ({resolutionType})"
-                # Afficher l'image dans la colonne correspondante
-                cols[i % cols_count].image(url, caption=caption, use_container_width=True)
+            if not asset["renditions"]:
+                continue
+            image = thumbnail(i, asset) or smallest_rendition(asset)
+            # Afficher l'image dans la colonne correspondante
+            cols[i % cols_count].image(image, caption=viewpoint, use_container_width=True)
 
     with tab_charge:
 
         # --- Historique des recharges ---
         st.subheader("⚡ Historique des recharges")
-        charges_df = pd.DataFrame(attrs['charge_history'])
-
-        # Ajout d'une colonne "marqueur" avec une icône si la charge est manuelle
-        charges_df["🔖"] = charges_df["fakeCharge"].apply(lambda x: "✨" if x else "")
-
-        # Tri des lignes
-        charges_df.sort_values('chargeStartDate', ascending=False, inplace=True)
+        charges_df = data.charges
 
         # Afficher le tableau des charges
-        if not charges_df.empty:
-            # Convetir les dates UTC en datetime
-            charges_df['chargeStartDate'] = pd.to_datetime(charges_df['chargeStartDate'], utc=True)
-            charges_df['chargeEndDate'] = pd.to_datetime(charges_df['chargeEndDate'], utc=True)
-
-            # Fuseau horaire local (ex: Paris)
-            paris_tz = pytz.timezone('Europe/Paris')
-
-            # Convertir en heure locale
-            charges_df['chargeStartDateLocal'] = charges_df['chargeStartDate'].dt.tz_convert(paris_tz)
-            charges_df['chargeEndDateLocal'] = charges_df['chargeEndDate'].dt.tz_convert(paris_tz)
-
-            # Formater les dates en DD/MM/YYYY HH:MM:SS
-            charges_df['chargeStartDateFormatted'] = charges_df['chargeStartDateLocal'].dt.strftime('%d/%m/%Y à %H:%M:%S')
-            charges_df['chargeEndDateFormatted'] = charges_df['chargeEndDateLocal'].dt.strftime('%d/%m/%Y à %H:%M:%S')
-
-            # Ajouter le symbole % pour le niveau de batterie
-            charges_df['chargeStartBatteryLevelStr'] = charges_df['chargeStartBatteryLevel'].astype(str) + " %"
-            charges_df['chargeEndBatteryLevelStr'] = charges_df['chargeEndBatteryLevel'].astype(str) + " %"
-            charges_df['chargePercentRecoveredStr'] = charges_df['chargePercentRecovered'].round(2).astype(str) + " %"
-
-            # Ajouter l'unité kWh pour la quantité d'énergie rechargée
-            charges_df['chargeEnergyRecoveredStr'] = charges_df['chargeEnergyRecovered'].round(2).astype(str) + " kWh"
-
-            # Conversion de la durée de recharge en heures et ajouter l'unité de temps
-            charges_df['chargeDurationStr'] = (charges_df['chargeDuration'] / 60).round(2).astype(str) + " h"
-
-            # Conversion de l'unité kW de puissance de recharge
-            charges_df['chargePowerStr'] = charges_df['chargePower'].round(2).astype(str) + " kW"
-
-            # Pour le tableau Streamlit, on peut afficher les colonnes formatées
-            display_df = charges_df[[
-                'chargeStartDateFormatted',
-                'chargeEndDateFormatted',
-                'chargeStartBatteryLevelStr',
-                'chargeEndBatteryLevelStr',
-                'chargeEnergyRecoveredStr',
-                'chargePercentRecoveredStr',
-                'chargeDurationStr',
-                'chargePowerStr',
-            ]].rename(columns={
-                'chargeStartDateFormatted': 'Début charge',
-                'chargeEndDateFormatted': 'Fin charge',
-                'chargeStartBatteryLevelStr': 'Niveau batterie début',
-                'chargeEndBatteryLevelStr': 'Niveau batterie fin',
-                'chargeEnergyRecoveredStr': 'Énergie rechargée (kWh)',
-                'chargePercentRecoveredStr': 'Pourcentage récupéré',
-                'chargeDurationStr': 'Durée de charge (h)',
-                'chargePowerStr': 'Puissance de charge (kW)'
-            })
-
-            # Calcul des totaux pour les colonnes numériques
-            total_energy = display_df['Énergie rechargée (kWh)'].str.replace(' kWh','').astype(float).sum()
-            total_percent = display_df['Pourcentage récupéré'].str.replace(' %','').astype(float).sum()
-            total_duration = display_df['Durée de charge (h)'].str.replace(' h','').astype(float).sum()
-            total_power = total_energy / total_duration
-
-            # Créer la ligne TOTAL avec le même format que display_df
-            total_row = {
-                'Début charge': '<b>TOTAL</b>',
-                'Fin charge': '',
-                'Niveau batterie début': '',
-                'Niveau batterie fin': '',
-                'Énergie rechargée (kWh)': f'{total_energy:.2f} kWh',
-                'Pourcentage récupéré': f'{total_percent:.2f} %',
-                'Durée de charge (h)': f'{total_duration:.2f} h',
-                'Puissance de charge (kW)': f'{total_power:.2f} kW'
-            }
-            
-            # Insérer la ligne TOTAL au début
-            display_df_total = pd.concat([pd.DataFrame([total_row]), display_df], ignore_index=True)
-
-            # Nombre de lignes de données (hors TOTAL)
-            n = len(display_df)
-
-            # Générer numérotation décroissante pour les lignes de données
-            index_labels = ['TOTAL']  # première ligne = TOTAL
-            for i, idx in enumerate(charges_df.index):
-                num = n - i
-                if charges_df.loc[idx, "fakeCharge"]:
-                    label = f"{num} <span title=\"Ajout magique d'une charge manquante dans l'API\">✨</span>"
-                else:
-                    label = f"{num}"
-                index_labels.append(label)
-
-            display_df_total.index = index_labels
-
-            # Mettre en gras les valeurs de la première ligne (TOTAL)
-            display_df_total.iloc[0] = display_df_total.iloc[0].apply(lambda x: f"<b>{x}</b>")
+        if charges_df.empty:
+            st.info("Aucune recharge disponible.")
+        else:
+            from views import PAGE_SIZE, battery_chart, build_charges_table, page_count
+
+            # Tableau paginé : seules les lignes de la page affichée sont formatées
+            pages = page_count(charges_df)
+            page = 1
+            if pages > 1:
+                page = st.number_input(f"Page (sur {pages}, {PAGE_SIZE} charges par page)", min_value=1, max_value=pages, value=1)
+            with span("ui.charges_table"):
+                display_df_total = build_charges_table(charges_df, page=page - 1)
 
             # Afficher le tableau avec HTML pour les icônes et index personnalisé
             st.write(display_df_total.to_html(escape=False), unsafe_allow_html=True)
@@ -248,35 +298,55 @@ if attrs:
             # Afficher le graphique de l'évolution du niveau de batterie
             #st.line_chart(charges_df.set_index('chargeStartDate')['chargeEndBatteryLevel'])
 
-            # Reconstruire les points pour la courbe
-            battery_times = []
-            battery_levels = []
-
-            for _, row in charges_df.iterrows():
-                # Début de charge
-                battery_times.append(row['chargeStartDate'])
-                battery_levels.append(row['chargeStartBatteryLevel'])
-                # Fin de charge
-                battery_times.append(row['chargeEndDate'])
-                battery_levels.append(row['chargeEndBatteryLevel'])
-
-            df_plot = pd.DataFrame({
-                'time': battery_times,
-                'level': battery_levels
-            })
-
-            # Indexer sur le temps
-            df_plot.set_index('time', inplace=True)
-
-            # Affichage de la courbe
+            # Courbe reconstruite à partir des débuts et fins de charge sur tout l'historique,
+            # avec par-dessus les relevés de télémétrie (sous-échantillonnés par SQLite) là où il y en a
             st.subheader("Évolution du niveau de batterie")
-            st.line_chart(df_plot['level'])
+            telemetry_df = battery_telemetry(attrs.vin, charges_df['chargeStartDate'].min(), attrs.last_update)
+            with span("ui.battery_curve"):
+                df_plot = battery_chart(charges_df, telemetry_df)
+            st.line_chart(df_plot)
+
+            # Agrégats tenus à jour à chaque synchronisation (voir analytics.py)
+            monthly, bands = charge_analytics(attrs.vin, attrs.nb_charges)
+            if not monthly.empty:
+                st.subheader("Énergie rechargée par mois (kWh)")
+                st.bar_chart(monthly['energy'])
+            if not bands.empty:
+                st.subheader("Charges par tranche de puissance")
+                st.dataframe(bands.rename(columns={
+                    'energy': 'Énergie (kWh)',
+                    'hours': 'Durée (h)',
+                    'charges': 'Charges',
+                    'avg_power': 'Puissance moyenne (kW)',
+                }).round(2), use_container_width=True)
 
     with tab_map:
         # --- Carte GPS ---
         st.subheader("🗺️ Localisation du véhicule")
-        df = pd.DataFrame(
-            [[attrs['gps']['latitude'], attrs['gps']['longitude']]],
-            columns=["lat", "lon"]
-        )
-        st.map(df, zoom=12)
\ No newline at end of file
+        if attrs.latitude is None:
+            st.info("Position GPS indisponible.")
+        else:
+            import pandas as pd
+
+            df = pd.DataFrame(
+                [[attrs.latitude, attrs.longitude]],
+                columns=["lat", "lon"]
+            )
+            st.map(df, zoom=12)
+
+# -------------------------------------------------------------------------
+# Panneau de diagnostic (?debug=1) : durées des dernières étapes
+# -------------------------------------------------------------------------
+if st.query_params.get("debug") == "1":
+    with st.expander("🛠️ Diagnostic", expanded=True):
+        metrics = METRICS.snapshot()
+        timings = {**snapshot_meta.get("timings", {}), **metrics["latest"]}
+        if timings:
+            import pandas as pd
+
+            st.dataframe(
+                pd.DataFrame({"durée (ms)": [round(t * 1000, 1) for t in timings.values()]}, index=list(timings)),
+                use_container_width=True,
+            )
+        st.write("Compteurs :", metrics["counters"])
+        st.write("Erreurs :", metrics["errors"])
@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import mimetypes
+import os
+import tempfile
+import threading
+from urllib.parse import urlparse
+
+from storage import DATA_DIR, DB_PATH, connect
+
+ASSETS_DIR = os.path.join(DATA_DIR, "assets") # fichiers des visuels, nommés par leur empreinte SHA-256
+THUMBNAIL_WIDTH = 480 # largeur (px) d'une colonne sur trois en mise en page "wide"
+MAX_CONCURRENT_DOWNLOADS = 4
+DOWNLOAD_TIMEOUT = 30
+RESOLUTIONS = ("SMALL", "MEDIUM", "LARGE") # fin du resolutionType des renditions, de la plus légère à la plus lourde
+
+class AssetCache:
+    """
+    Cache local des visuels du véhicule (vehicleDetails.assets) : chaque rendition n'est téléchargée
+    qu'une fois, stockée sous son empreinte (deux URL au même contenu partagent un fichier),
+    puis réduite à la largeur d'affichage. Le tableau de bord sert ainsi une seule vignette
+    locale par point de vue au lieu de toutes les renditions pleine résolution du CDN.
+    """
+
+    def __init__(self, directory=ASSETS_DIR, path=DB_PATH):
+        self.directory = directory
+        self._db = connect(path)
+        self._lock = threading.Lock()
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS asset_files (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                ext TEXT NOT NULL,
+                width INTEGER,
+                height INTEGER
+            )
+        """)
+        self._db.commit()
+
+    def lookup(self, url):
+        """(empreinte, extension, largeur, hauteur) d'une rendition déjà téléchargée, ou None."""
+        with self._lock:
+            return self._db.execute("SELECT digest, ext, width, height FROM asset_files WHERE url = ?", (url,)).fetchone()
+
+    def missing(self, assets):
+        """URL des renditions de 'assets' pas encore téléchargées."""
+        urls = [r["url"] for asset in assets for r in asset.get("renditions", [])]
+        return [url for url in dict.fromkeys(urls) if self.lookup(url) is None]
+
+    async def prefetch(self, assets, websession=None):
+        """
+        Télécharge les renditions absentes du cache (au plus MAX_CONCURRENT_DOWNLOADS à la fois).
+        Un échec n'empêche pas les autres téléchargements ; retourne le nombre de renditions ajoutées.
+        """
+        urls = self.missing(assets)
+        if not urls:
+            return 0
+        import aiohttp
+
+        if websession is None:
+            async with aiohttp.ClientSession() as session:
+                return await self.prefetch(assets, websession=session)
+
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+        timeout = aiohttp.ClientTimeout(total=DOWNLOAD_TIMEOUT)
+
+        async def download(url):
+            async with semaphore:
+                try:
+                    async with websession.get(url, timeout=timeout) as response:
+                        response.raise_for_status()
+                        content = await response.read()
+                        content_type = response.headers.get("Content-Type", "")
+                except Exception:
+                    return False
+            self.add(url, content, content_type)
+            return True
+
+        return sum(await asyncio.gather(*(download(url) for url in urls)))
+
+    def add(self, url, content, content_type=""):
+        """Enregistre le contenu d'une rendition sous son empreinte SHA-256."""
+        digest = hashlib.sha256(content).hexdigest()
+        ext = os.path.splitext(urlparse(url).path)[1].lower()
+        if not ext:
+            ext = mimetypes.guess_extension(content_type.split(";")[0].strip()) or ".img"
+        path = self._blob_path(digest, ext)
+        if not os.path.exists(path):
+            _write_atomic(path, content)
+        width, height = _image_size(path)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO asset_files VALUES (?, ?, ?, ?, ?)", (url, digest, ext, width, height))
+            self._db.commit()
+
+    def image_for(self, asset, width=THUMBNAIL_WIDTH):
+        """
+        Fichier local à afficher pour ce point de vue à la largeur 'width' : la plus petite rendition
+        au moins aussi large, réduite en vignette si elle l'est davantage. None si rien n'est en cache.
+        """
+        cached = []
+        for rendition in asset.get("renditions", []):
+            row = self.lookup(rendition["url"])
+            if row is not None:
+                cached.append(row)
+        if not cached:
+            return None
+        wide_enough = [row for row in cached if row[2] is not None and row[2] >= width]
+        if wide_enough:
+            digest, ext, source_width, _ = min(wide_enough, key=lambda row: row[2])
+        else:
+            digest, ext, source_width, _ = max(cached, key=lambda row: row[2] or 0)
+        source = self._blob_path(digest, ext)
+        if source_width is None or source_width <= width:
+            return source
+        return self._thumbnail(source, digest, width)
+
+    def _thumbnail(self, source, digest, width):
+        path = os.path.join(self.directory, "thumbs", f"{digest}-{width}.webp")
+        if os.path.exists(path):
+            return path
+        from PIL import Image
+
+        with Image.open(source) as image:
+            image.thumbnail((width, width * 4))
+            fd, tmp_path = tempfile.mkstemp(dir=_makedirs(path), suffix=".tmp")
+            os.close(fd)
+            try:
+                image.save(tmp_path, format="WEBP", quality=85)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        return path
+
+    def _blob_path(self, digest, ext):
+        return os.path.join(self.directory, "blobs", digest[:2], digest + ext)
+
+def smallest_rendition(asset):
+    """
+    URL de la rendition la plus légère d'un point de vue d'après son resolutionType
+    (ex. ONE_MYRENAULT_SMALL avant ONE_MYRENAULT_LARGE), à afficher tant que la vignette n'est pas prête.
+    """
+    def rank(rendition):
+        resolution = rendition.get("resolutionType", "").upper()
+        return next((i for i, suffix in enumerate(RESOLUTIONS) if resolution.endswith(suffix)), len(RESOLUTIONS))
+    return min(asset["renditions"], key=rank)["url"]
+
+def _makedirs(path):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def _write_atomic(path, content):
+    fd, tmp_path = tempfile.mkstemp(dir=_makedirs(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _image_size(path):
+    try:
+        from PIL import Image
+
+        with Image.open(path) as image:
+            return image.size
+    except Exception:
+        # Pillow absent ou format illisible : la rendition sera servie telle quelle
+        return None, None
@@ -0,0 +1,183 @@
+import argparse
+import ast
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from analytics import AnalyticsStore
+from corrections import correct_charges, correct_charges_reference
+from main import get_renault_data
+from models import to_charge_frame
+from replay import FakeRenaultClient, synthetic_charges, synthetic_fixture
+from session import RenaultSessionManager
+from telemetry import TelemetryStore
+from views import battery_curve, build_charges_table
+
+CORRECTION_SIZES = [10_000, 100_000, 1_000_000]
+REFERENCE_MAX_SIZE = 100_000 # au-delà, la boucle de référence est trop lente pour être mesurée à chaque fois
+RENDER_SIZES = [1_000, 10_000, 100_000]
+REFRESH_RUNS = 5
+STARTUP_RUNS = 5
+STARTUP_MODULES = ["main", "session", "poller"] # points d'entrée mesurés en plus des imports de app.py
+SUITES = ["refresh", "corrections", "render", "startup"]
+
+def timed(fn, runs=1):
+    """Médiane (en secondes) de 'runs' exécutions de fn(), sorties console ignorées."""
+    durations = []
+    for _ in range(runs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn()
+            durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+def bench_refresh(latency, jitter, runs=REFRESH_RUNS):
+    """Rafraîchissement de bout en bout sur le client de rejeu : complet (login + découverte) puis avec session persistante."""
+    fixture = synthetic_fixture(n_charges=500)
+    # relevés et agrégats dans une base jetable : le rejeu n'écrit rien dans la base locale,
+    # mais la récupération mesurée comprend bien le calcul de la consommation
+    tmp = tempfile.TemporaryDirectory()
+    db_path = os.path.join(tmp.name, "bench.sqlite")
+    telemetry, analytics = TelemetryStore(db_path), AnalyticsStore(db_path)
+    results = {
+        "refresh.full": timed(lambda: asyncio.run(get_renault_data(
+            "bench", "bench", client=FakeRenaultClient(fixture, latency=latency, jitter=jitter, seed=0),
+            telemetry=telemetry, analytics=analytics,
+        )), runs),
+    }
+    manager = RenaultSessionManager(
+        "bench", "bench", telemetry=telemetry, analytics=analytics,
+        client_factory=lambda: FakeRenaultClient(fixture, latency=latency, jitter=jitter, seed=0),
+    )
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager.get_data() # connexion et découverte hors mesure
+        results["refresh.session"] = timed(lambda: manager.get_data(force_refresh=True), runs)
+        results["refresh.cached"] = timed(manager.get_data, runs)
+    finally:
+        manager.close()
+        tmp.cleanup()
+    return results
+
+def bench_corrections(sizes=CORRECTION_SIZES):
+    """Débit de la passe de corrections sur des historiques synthétiques."""
+    results = {}
+    for n in sizes:
+        charges = synthetic_charges(n)
+        results[f"corrections.vectorized.{n}"] = timed(lambda: correct_charges(charges))
+        if n <= REFERENCE_MAX_SIZE:
+            # la référence produit des dicts : sa conversion en tableau typé fait partie du coût comparé
+            results[f"corrections.reference.{n}"] = timed(lambda: to_charge_frame(correct_charges_reference(charges)))
+            # une version plus rapide mais fausse ne doit pas passer pour un gain
+            expected = to_charge_frame(correct_charges_reference(charges))
+            pd.testing.assert_frame_equal(correct_charges(charges), expected)
+    return results
+
+def bench_render(sizes=RENDER_SIZES):
+    """Préparation des données de l'onglet "Recharges" (tableau et courbe)."""
+    results = {}
+    for n in sizes:
+        charges = correct_charges(synthetic_charges(n))
+        results[f"render.table.{n}"] = timed(lambda: build_charges_table(charges))
+        results[f"render.curve.{n}"] = timed(lambda: battery_curve(charges))
+    return results
+
+def import_time(modules, runs=STARTUP_RUNS):
+    """
+    Médiane (en secondes) du temps d'import de 'modules' dans un interpréteur neuf, mesuré par
+    python -X importtime (cumul des modules de premier niveau) : coût d'un démarrage à froid.
+    """
+    code = "; ".join(f"import {m}" for m in modules)
+    here = os.path.dirname(os.path.abspath(__file__))
+    durations = []
+    for _ in range(runs):
+        stderr = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code], cwd=here, capture_output=True, text=True, check=True
+        ).stderr
+        total = 0
+        for line in stderr.splitlines():
+            # "import time: self [us] | cumulative | imported package" ; niveau 0 = pas d'indentation
+            parts = line.split("|")
+            if len(parts) == 3 and parts[1].strip().isdigit() and not parts[2].startswith("  "):
+                total += int(parts[1])
+        durations.append(total / 1e6)
+    return statistics.median(durations)
+
+def app_imports(path="app.py"):
+    """Modules importés au chargement de app.py (imports de premier niveau du script)."""
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), path), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            modules.append(node.module)
+    return modules
+
+def bench_startup(modules=STARTUP_MODULES, runs=STARTUP_RUNS):
+    """Démarrage à froid : imports du tableau de bord (avant toute donnée) et des points d'entrée."""
+    results = {}
+    try:
+        results["startup.app"] = import_time(app_imports(), runs)
+    except subprocess.CalledProcessError:
+        pass # streamlit absent de l'environnement de mesure
+    for module in modules:
+        results[f"startup.{module}"] = import_time([module], runs)
+    return results
+
+def compare(results, baseline, tolerance):
+    """Retourne les mesures plus lentes que la référence de plus de 'tolerance' (ex. 0.2 = +20 %)."""
+    return {
+        name: (baseline[name], value)
+        for name, value in results.items()
+        if name in baseline and value > baseline[name] * (1 + tolerance)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks hors ligne (client de rejeu, historiques synthétiques).")
+    parser.add_argument("suites", nargs="*", help="suites à exécuter parmi %(choices)s (toutes par défaut)" % {"choices": SUITES})
+    parser.add_argument("--latency", type=float, default=0.15, help="latence simulée de chaque appel (s)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="gigue aléatoire ajoutée à la latence (s)")
+    parser.add_argument("--sizes", type=int, nargs="+", help="tailles d'historique pour corrections/render")
+    parser.add_argument("--output", help="enregistre les mesures en JSON")
+    parser.add_argument("--baseline", help="mesures JSON de référence : échec si une mesure régresse")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="régression tolérée par rapport à la référence")
+    args = parser.parse_args()
+
+    suites = args.suites or SUITES
+    for suite in suites:
+        if suite not in SUITES:
+            parser.error(f"suite inconnue : {suite}")
+    results = {}
+    if "refresh" in suites:
+        results.update(bench_refresh(args.latency, args.jitter))
+    if "corrections" in suites:
+        results.update(bench_corrections(args.sizes or CORRECTION_SIZES))
+    if "render" in suites:
+        results.update(bench_render(args.sizes or RENDER_SIZES))
+    if "startup" in suites:
+        results.update(bench_startup())
+
+    for name, value in results.items():
+        print(f"{name:<40} {value * 1000:10.1f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name, (before, after) in regressions.items():
+            print(f"RÉGRESSION {name}: {before * 1000:.1f} ms -> {after * 1000:.1f} ms")
+        sys.exit(1 if regressions else 0)
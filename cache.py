@@ -0,0 +1,81 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# durée de fraîcheur (en secondes) de chaque endpoint : la batterie bouge toutes les quelques minutes,
+# le kilométrage rarement, l'historique de charges seulement à la fin d'une session
+DEFAULT_TTLS = {
+    "battery": 120,
+    "cockpit": 3600,
+    "charges": 900,
+    "location": 300,
+}
+DEFAULT_TTL = 300 # pour un endpoint absent de la table
+MAX_ENTRIES = 256
+
+class TTLCache:
+    """
+    Cache des réponses brutes (raw_data) de l'API, indexé par (VIN, endpoint, paramètres).
+    Chaque endpoint a sa propre durée de fraîcheur, la mémoire est bornée par éviction LRU
+    et un fichier SQLite optionnel permet de conserver les réponses entre deux lancements.
+    """
+
+    def __init__(self, ttls=None, max_entries=MAX_ENTRIES, path=None):
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # clé -> (expiration, valeur)
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, expires REAL, value TEXT)")
+            self._db.commit()
+
+    def ttl(self, endpoint):
+        return self.ttls.get(endpoint, DEFAULT_TTL)
+
+    def get(self, key):
+        """Retourne la valeur encore fraîche associée à la clé, ou None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT expires, value FROM cache WHERE key = ?", (_disk_key(key),)).fetchone()
+            if row is None or row[0] <= now:
+                return None
+            value = json.loads(row[1])
+            self._store(key, row[0], value)
+            return value
+
+    def set(self, key, value):
+        _, endpoint, _ = key
+        expires = time.time() + self.ttl(endpoint)
+        with self._lock:
+            self._store(key, expires, value)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", (_disk_key(key), expires, json.dumps(value)))
+                self._db.execute("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+                self._db.commit()
+
+    def _store(self, key, expires, value):
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+def cache_key(vin, endpoint, **params):
+    """Clé de cache stable : les paramètres sont triés pour être indépendants de l'ordre d'appel."""
+    return (vin, endpoint, tuple(sorted(params.items())))
+
+def _disk_key(key):
+    vin, endpoint, params = key
+    return json.dumps([vin, endpoint, [list(p) for p in params]])
@@ -0,0 +1,124 @@
+import json
+import threading
+from datetime import timedelta
+
+from dates import parse_iso
+from storage import DB_PATH, connect
+
+CHUNK_SIZE = 10_000 # charges lues par requête lors d'un parcours complet de l'historique
+INITIAL_SYNC_DAYS = 30 # fenêtre demandée à l'API lors de la première synchronisation
+SYNC_OVERLAP = timedelta(hours=12) # on redemande la fin de la dernière fenêtre, pour les charges en cours au moment de la synchro
+
+class ChargeStore:
+    """
+    Historique local des recharges, en ajout seul : on ne demande à l'API que les charges
+    postérieures à la dernière chargeEndDate connue, puis on fusionne en dédoublonnant
+    par (VIN, chargeStartDate). L'historique n'est ainsi plus limité aux 30 derniers jours.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self._db = connect(path)
+        self._lock = threading.Lock()
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS charges (
+                vin TEXT NOT NULL,
+                chargeStartDate TEXT NOT NULL,
+                chargeEndDate TEXT NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (vin, chargeStartDate)
+            )
+        """)
+        self._db.commit()
+
+    def last_end_date(self, vin):
+        """Dernière chargeEndDate enregistrée pour ce VIN (datetime UTC), ou None."""
+        with self._lock:
+            row = self._db.execute("SELECT MAX(chargeEndDate) FROM charges WHERE vin = ?", (vin,)).fetchone()
+        if row[0] is None:
+            return None
+        return parse_iso(row[0])
+
+    def sync_window(self, vin, now):
+        """Fenêtre (start, end) à demander à get_charges pour ne récupérer que le delta."""
+        last_end = self.last_end_date(vin)
+        if last_end is None:
+            return now - timedelta(days=INITIAL_SYNC_DAYS), now
+        return last_end - SYNC_OVERLAP, now
+
+    def merge(self, vin, charges):
+        """
+        Fusionne des charges brutes de l'API dans l'historique.
+        Une charge déjà connue (même chargeStartDate) est remplacée par sa version la plus récente.
+        Retourne le nombre de charges nouvelles.
+        """
+        rows = [(vin, c['chargeStartDate'], c['chargeEndDate'], json.dumps(c)) for c in charges]
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany("INSERT OR IGNORE INTO charges VALUES (?, ?, ?, ?)", rows)
+            inserted = self._db.total_changes - before
+            self._db.executemany(
+                "UPDATE charges SET chargeEndDate = ?, data = ? WHERE vin = ? AND chargeStartDate = ?",
+                [(end, data, v, start) for v, start, end, data in rows],
+            )
+            self._db.commit()
+        return inserted
+
+    def load(self, vin, start=None, end=None):
+        """Charges brutes du VIN, triées par date de début, éventuellement bornées par des dates ISO."""
+        query = "SELECT data FROM charges WHERE vin = ?"
+        params = [vin]
+        if start is not None:
+            query += " AND chargeStartDate >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND chargeStartDate < ?"
+            params.append(end)
+        query += " ORDER BY chargeStartDate"
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def vins(self):
+        with self._lock:
+            return [vin for (vin,) in self._db.execute("SELECT DISTINCT vin FROM charges ORDER BY vin")]
+
+    def iter_chunks(self, vin, start=None, end=None, chunk_size=CHUNK_SIZE):
+        """
+        Parcourt l'historique du VIN par morceaux de 'chunk_size' charges brutes, triées par date de début
+        et éventuellement bornées par des dates ISO : la mémoire utilisée ne dépend pas de la taille de l'historique.
+        """
+        after = None
+        while True:
+            query = "SELECT chargeStartDate, data FROM charges WHERE vin = ?"
+            params = [vin]
+            # pagination par clé : chaque morceau reprend après la dernière date du précédent
+            if after is not None:
+                query += " AND chargeStartDate > ?"
+                params.append(after)
+            elif start is not None:
+                query += " AND chargeStartDate >= ?"
+                params.append(start)
+            if end is not None:
+                query += " AND chargeStartDate < ?"
+                params.append(end)
+            query += " ORDER BY chargeStartDate LIMIT ?"
+            params.append(chunk_size)
+            with self._lock:
+                rows = self._db.execute(query, params).fetchall()
+            if not rows:
+                return
+            yield [json.loads(data) for _, data in rows]
+            after = rows[-1][0]
+
+    def end_before(self, vin, start):
+        """
+        (niveau de fin, date de fin) de la dernière charge avec énergie antérieure à 'start' (date ISO),
+        ou (None, None).
+        """
+        with self._lock:
+            row = self._db.execute("""
+                SELECT json_extract(data, '$.chargeEndBatteryLevel'), chargeEndDate FROM charges
+                WHERE vin = ? AND chargeStartDate < ? AND json_extract(data, '$.chargeEnergyRecovered') != 0
+                ORDER BY chargeStartDate DESC LIMIT 1
+            """, (vin, start)).fetchone()
+        return tuple(row) if row is not None else (None, None)
@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+
+from dates import parse_iso, shift_date
+from models import CHARGE_DTYPES
+
+USABLE_CAPACITY = 52.0 # capacité utile de la batterie
+DEFAULT_CHARGE_DURATION = 359 # durée de recharge utilisé lorsqu'une charge a été oubliée par l'API et qu'on l'ajoute de manière automatique et forcée
+
+CHARGE_COLUMNS = [
+    "chargeStartDate",
+    "chargeEndDate",
+    "chargeStartBatteryLevel",
+    "chargeEndBatteryLevel",
+    "chargeEnergyRecovered",
+    "chargePercentRecovered",
+    "chargeDuration",
+    "chargePower",
+    "fakeCharge",
+]
+RAW_COLUMNS = [
+    "chargeStartDate",
+    "chargeEndDate",
+    "chargeStartBatteryLevel",
+    "chargeEndBatteryLevel",
+    "chargeEnergyRecovered",
+    "chargeDuration",
+]
+ROUNDED_COLUMNS = {"chargeStartBatteryLevel", "chargeEndBatteryLevel", "chargeDuration"} # entiers dans l'historique typé
+
+def correct_charges(charges, previous_end_level=None):
+    """
+    Version vectorisée (numpy) des corrections appliquées aux charges brutes de l'API :
+    - tri par date de début, suppression des charges sans énergie
+    - niveau de départ recalculé quand il vaut 0 ou le niveau de fin
+    - durée nulle ramenée à 1 minute, calcul de la puissance (kW)
+    - insertion d'une charge "fakeCharge" la veille quand une charge démarre plus haut
+      que la précédente ne s'est terminée
+    'previous_end_level' permet d'enchaîner les appels par morceaux d'historique.
+    Les colonnes sont extraites une seule fois des dicts bruts (ou d'un DataFrame) et les dates analysées
+    une seule fois : le résultat est directement l'historique typé (voir models.CHARGE_DTYPES),
+    identique à to_charge_frame(correct_charges_reference(charges)).
+    """
+    columns = _raw_columns(charges)
+    energy = np.asarray(columns["chargeEnergyRecovered"], dtype="float64")
+    if not len(energy):
+        return _typed_frame({})
+    starts = _parse_dates(columns["chargeStartDate"])
+    order = np.argsort(starts, kind="stable")
+    order = order[energy[order] != 0]
+    if not len(order):
+        return _typed_frame({})
+
+    starts = starts[order]
+    ends = _parse_dates(columns["chargeEndDate"])[order]
+    energy = energy[order]
+    end_level = np.asarray(columns["chargeEndBatteryLevel"], dtype="float64")[order]
+    raw_start_level = np.asarray(columns["chargeStartBatteryLevel"], dtype="float64")[order]
+    percent = energy / USABLE_CAPACITY * 100
+
+    # Correction manuelle à appliquer sur les données boguées
+    bogus = (raw_start_level == 0) | (raw_start_level == end_level)
+    start_level = np.where(bogus, np.round(end_level - percent), raw_start_level)
+
+    # Correction manuelle si charge < 1min on considère qu'elle a durée 1min et pas "0"
+    duration = np.asarray(columns["chargeDuration"], dtype="float64")[order]
+    duration = np.where(duration == 0, 1, duration)
+
+    # Correction manuelle : détection des recharges manquantes (départ plus haut que la fin précédente)
+    previous_end = np.concatenate([[np.nan if previous_end_level is None else previous_end_level], end_level[:-1]])
+    gap = ~np.isnan(previous_end) & (start_level > previous_end)
+
+    # chaque charge ajoutée précède la charge réelle qui a révélé le trou
+    real_rows = np.arange(len(order)) + np.cumsum(gap)
+    fake_rows = real_rows[gap] - 1
+    size = len(order) + len(fake_rows)
+
+    def place(real, fake):
+        out = np.empty(size, dtype=np.result_type(real, fake))
+        out[real_rows] = real
+        out[fake_rows] = fake
+        return out
+
+    gap_start = start_level[gap]
+    percent_recovered = gap_start - previous_end[gap]
+    missing_energy = percent_recovered / 100 * USABLE_CAPACITY
+    return _typed_frame({
+        "chargeStartDate": place(starts, _shift_dates(starts[gap])),
+        "chargeEndDate": place(ends, _shift_dates(ends[gap])),
+        "chargeStartBatteryLevel": place(start_level, gap_start - percent_recovered),
+        "chargeEndBatteryLevel": place(end_level, gap_start),
+        "chargeEnergyRecovered": place(energy, missing_energy),
+        "chargePercentRecovered": place(_round2(percent), _round2(missing_energy / USABLE_CAPACITY * 100)),
+        "chargeDuration": place(duration, np.full(len(fake_rows), DEFAULT_CHARGE_DURATION, dtype="float64")),
+        "chargePower": place(energy / (duration / 60), missing_energy / (DEFAULT_CHARGE_DURATION / 60)),
+        "fakeCharge": place(np.zeros(len(order), dtype=bool), np.ones(len(fake_rows), dtype=bool)),
+    })
+
+def correct_charges_reference(charges):
+    """
+    Implémentation de référence, charge par charge, des corrections de correct_charges.
+    Conservée pour vérifier que la version vectorisée produit exactement le même résultat.
+    """
+    charges = sorted(charges,
+        key=lambda x: parse_iso(x['chargeStartDate'])
+    )
+
+    custom_charges = []
+    previous_end_level = None
+    for charge in charges:
+        if charge['chargeEnergyRecovered'] == 0:
+            continue
+
+        chargeStartBatteryLevel = charge['chargeStartBatteryLevel']
+        chargeEndBatteryLevel = charge['chargeEndBatteryLevel']
+        chargeEnergyRecovered = charge['chargeEnergyRecovered']
+        chargePercentRecovered = chargeEnergyRecovered / USABLE_CAPACITY * 100
+
+        # Correction manuelle à appliquer sur les données boguées
+        if (charge['chargeStartBatteryLevel'] == 0 or charge['chargeStartBatteryLevel'] == charge['chargeEndBatteryLevel']):
+            chargeStartBatteryLevel = int(round(charge['chargeEndBatteryLevel'] - chargePercentRecovered, 0))
+
+        # Correction manuelle si charge < 1min on considère qu'elle a durée 1min et pas "0"
+        charge_duration = charge['chargeDuration']
+        if charge_duration == 0:
+            charge_duration = 1
+
+        # Calcul de la puissance de charge (kW)
+        chargePower = chargeEnergyRecovered / (charge_duration / 60)
+
+        # Correction manuelle : insertion manuelle de recharge manquante
+        if previous_end_level is not None and chargeStartBatteryLevel > previous_end_level:
+            percent_recovered = chargeStartBatteryLevel - previous_end_level
+            missing_energy = percent_recovered / 100 * USABLE_CAPACITY
+
+            custom_charges.append({
+                "chargeStartDate": shift_date(charge['chargeStartDate'], days=-1),
+                "chargeEndDate": shift_date(charge['chargeEndDate'], days=-1),
+                "chargeStartBatteryLevel": chargeStartBatteryLevel - percent_recovered,
+                "chargeEndBatteryLevel": chargeStartBatteryLevel,
+                "chargeEnergyRecovered": missing_energy,
+                "chargePercentRecovered": round((missing_energy / USABLE_CAPACITY * 100), 2),
+                "chargeDuration": DEFAULT_CHARGE_DURATION,
+                "chargePower": missing_energy / (DEFAULT_CHARGE_DURATION / 60),
+                "fakeCharge": True
+            })
+
+        # Enregistrer les données corrigées et filtrées
+        custom_charges.append({
+            "chargeStartDate": charge['chargeStartDate'],
+            "chargeEndDate": charge['chargeEndDate'],
+            "chargeStartBatteryLevel": chargeStartBatteryLevel,
+            "chargeEndBatteryLevel": chargeEndBatteryLevel,
+            "chargeEnergyRecovered": chargeEnergyRecovered,
+            "chargePercentRecovered": round(chargePercentRecovered, 2),
+            "chargeDuration": charge_duration,
+            "chargePower": chargePower,
+            "fakeCharge": False
+        })
+
+        previous_end_level = chargeEndBatteryLevel
+
+    return custom_charges
+
+def _raw_columns(charges):
+    """Colonnes utiles des charges brutes (liste de dicts de l'API ou du ChargeStore, ou DataFrame)."""
+    if isinstance(charges, pd.DataFrame):
+        return {column: charges[column].to_numpy() if column in charges else [] for column in RAW_COLUMNS}
+    return {column: [charge[column] for charge in charges] for column in RAW_COLUMNS}
+
+def _parse_dates(dates):
+    """
+    Dates ISO en datetime64[ns] (UTC). Quand toutes ont le format de l'API ('2025-08-06T12:24:06Z'),
+    numpy les lit directement, bien plus vite que l'analyse ISO générale de pandas.
+    """
+    if all(isinstance(d, str) and len(d) == 20 and d[-1] == "Z" for d in dates):
+        return np.array([d[:-1] for d in dates], dtype="datetime64[s]").astype("datetime64[ns]")
+    parsed = pd.to_datetime(pd.Series(dates, dtype=object), utc=True, format="ISO8601")
+    return parsed.dt.tz_convert(None).dt.as_unit("ns").to_numpy()
+
+def _shift_dates(dates, days=-1):
+    """Version vectorisée de shift_date : décale de 'days' jours, à la seconde près."""
+    return (dates.astype("datetime64[s]") + np.timedelta64(days, "D")).astype("datetime64[ns]")
+
+def _typed_frame(columns):
+    """Tableau typé (models.CHARGE_DTYPES) construit colonne par colonne, sans conversion pandas."""
+    if not columns:
+        return pd.DataFrame(columns=CHARGE_COLUMNS).astype(CHARGE_DTYPES)
+    typed = {}
+    for column, dtype in CHARGE_DTYPES.items():
+        values = columns[column]
+        if column in ("chargeStartDate", "chargeEndDate"):
+            typed[column] = pd.DatetimeIndex(values).tz_localize("UTC")
+        else:
+            typed[column] = (np.round(values) if column in ROUNDED_COLUMNS else values).astype(dtype)
+    return pd.DataFrame(typed)
+
+def _round2(values):
+    """
+    Arrondi à 2 décimales identique au round() de Python : np.round suffit sauf à proximité
+    immédiate d'un demi-centième, où l'on délègue les rares valeurs concernées à round().
+    """
+    rounded = np.round(values, 2)
+    scaled = np.abs(np.asarray(values, dtype=float)) * 100
+    ambiguous = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if ambiguous.any():
+        rounded = rounded.copy()
+        rounded[ambiguous] = [round(float(v), 2) for v in values[ambiguous]]
+    return rounded
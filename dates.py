@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+PARIS_TZ = ZoneInfo("Europe/Paris") # fuseau d'affichage, construit une seule fois
+JOURS = ("Lun.", "Mar.", "Mer.", "Jeu.", "Ven.", "Sam.", "Dim.") # noms des jours, lundi = 0
+
+@lru_cache(maxsize=4096)
+def parse_iso(date_str: str) -> datetime:
+    """
+    Transforme une date ISO8601 de l'API (ex. '2025-08-06T12:24:06Z') en datetime.
+    Les mêmes horodatages revenant à chaque rafraîchissement, le résultat est mémorisé.
+    """
+    return datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+
+def format_date(date) -> str:
+    """Date ISO (ou datetime) affichée à l'heure de Paris, ex. 'Mer. 06/08 à 14h24:06'."""
+    dt = parse_iso(date) if isinstance(date, str) else date
+
+    # conversion de l'heure UTC au fuseau horaire de Paris
+    dt = dt.astimezone(PARIS_TZ)
+
+    # ajout des secondes avec %S
+    return f"{JOURS[dt.weekday()]} {dt.strftime('%d/%m à %Hh%M:%S')}"
+
+def shift_date(date_str: str, days: int = -1) -> str:
+    """
+    Décale une date ISO8601 (UTC) de 'days' jours.
+    Exemple de date attendue : '2025-08-06T12:24:06Z'
+    """
+    shifted = parse_iso(date_str) + timedelta(days=days)
+    return shifted.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def format_dates(series, fmt="%d/%m/%Y à %H:%M:%S"):
+    """Version vectorisée pour une colonne pandas de dates UTC : conversion à l'heure de Paris puis formatage."""
+    return series.dt.tz_convert(PARIS_TZ).dt.strftime(fmt)
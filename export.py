@@ -0,0 +1,154 @@
+import argparse
+import gzip
+import os
+import sys
+from datetime import timezone
+
+from charge_store import CHUNK_SIZE, ChargeStore
+from corrections import correct_charges
+from dates import parse_iso
+from reconstruction import GapReconstructor
+from storage import DB_PATH
+from telemetry import TABLES, TelemetryStore
+
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".parquet": "parquet"}
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd"}
+DATASETS = ["charges", *TABLES]
+FLOAT32_DECIMALS = 3 # décimales conservées en CSV et JSON Lines pour les colonnes float32 (kWh, kW, %)
+
+def iter_charge_frames(store, vins, start=None, end=None, chunk_size=CHUNK_SIZE, reconstructor=None, telemetry=None):
+    """
+    Historique corrigé (charges ajoutées "fakeCharge" comprises) de chaque VIN, par morceaux typés.
+    Le niveau et la date de fin de la dernière charge d'un morceau sont reportés sur le suivant : les charges
+    manquantes à la jonction de deux morceaux sont détectées comme sur l'historique complet.
+    Avec un reconstructeur et la télémétrie, les charges ajoutées sont celles du tableau de bord
+    (reconstituées depuis les relevés de batterie quand il y en a).
+    """
+    start_iso = _iso(start)
+    end_iso = _iso(end)
+    for vin in vins:
+        previous_end_level, previous_end_date = store.end_before(vin, start_iso) if start_iso is not None else (None, None)
+        for chunk in store.iter_chunks(vin, start_iso, end_iso, chunk_size):
+            corrected = correct_charges(chunk, previous_end_level=previous_end_level)
+            if corrected.empty:
+                continue
+            if reconstructor is not None and telemetry is not None:
+                corrected = reconstructor.reconstruct(vin, corrected, telemetry, previous_end_date=previous_end_date)
+            previous_end_level = corrected["chargeEndBatteryLevel"].iloc[-1]
+            previous_end_date = corrected["chargeEndDate"].iloc[-1]
+            corrected.insert(0, "vin", vin)
+            yield corrected
+
+def iter_telemetry_frames(telemetry, kind, vins, start=None, end=None):
+    """Relevés bruts de type 'kind' de chaque VIN, par morceaux, avec leur date en colonne."""
+    for vin in vins:
+        for chunk in telemetry.iter_chunks(kind, vin, start, end):
+            frame = chunk.reset_index()
+            frame.insert(0, "vin", vin)
+            yield frame
+
+def write_frames(frames, path, fmt, compression=None):
+    """
+    Écrit les morceaux au fur et à mesure dans 'path' (un seul morceau en mémoire à la fois).
+    CSV et JSON Lines sont compressés en flux (gzip, ou zstd avec le paquet zstandard) ;
+    Parquet utilise la compression interne de ses pages (pyarrow requis).
+    Retourne le nombre de lignes écrites.
+    """
+    if fmt == "parquet":
+        return _write_parquet(frames, path, compression)
+    rows = 0
+    with _open_text(path, compression) as f:
+        for i, frame in enumerate(frames):
+            if fmt == "csv":
+                _exact_floats(frame).to_csv(f, header=(i == 0), index=False, date_format="%Y-%m-%dT%H:%M:%SZ")
+            else:
+                # to_json(lines=True) termine déjà chaque morceau par un saut de ligne
+                f.write(_exact_floats(frame).to_json(orient="records", lines=True, date_format="iso", date_unit="s"))
+            rows += len(frame)
+    return rows
+
+def _exact_floats(frame):
+    # to_csv et to_json écrivent les float32 (énergie, puissance) avec leur bruit binaire, ex. 5.3699998856 pour 5.37 ;
+    # arrondis ici, les deux formats texte exportent les mêmes valeurs
+    columns = frame.select_dtypes("float32").columns
+    if columns.empty:
+        return frame
+    return frame.astype({c: "float64" for c in columns}).round({c: FLOAT32_DECIMALS for c in columns})
+
+def _write_parquet(frames, path, compression):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rows = 0
+    writer = None
+    try:
+        for frame in frames:
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema, compression=compression or "snappy")
+            writer.write_table(table.cast(writer.schema))
+            rows += len(frame)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+def _open_text(path, compression):
+    if compression == "gzip":
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    if compression == "zstd":
+        import zstandard
+
+        return zstandard.open(path, "wt", encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+def _iso(date):
+    return date.strftime("%Y-%m-%dT%H:%M:%SZ") if date is not None else None
+
+def _parse_date(value):
+    """Date de la ligne de commande ('2025-01-31' ou ISO complète), en UTC si le fuseau n'est pas précisé."""
+    date = parse_iso(value)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.astimezone(timezone.utc)
+
+def guess_format(path):
+    """(format, compression) déduits de l'extension, ex. 'charges.csv.gz' -> ('csv', 'gzip')."""
+    root, ext = os.path.splitext(path)
+    compression = COMPRESSIONS.get(ext)
+    if compression is not None:
+        root, ext = os.path.splitext(root)
+    return FORMATS.get(ext), compression
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporte l'historique des charges ou la télémétrie enregistrés localement.")
+    parser.add_argument("dataset", choices=DATASETS, help="charges (corrigées) ou type de relevés de télémétrie")
+    parser.add_argument("output", help="fichier de sortie ; le format et la compression se déduisent de l'extension (ex. charges.jsonl.gz)")
+    parser.add_argument("--format", choices=sorted(set(FORMATS.values())), help="format si l'extension ne suffit pas")
+    parser.add_argument("--compression", choices=sorted(set(COMPRESSIONS.values())), help="compression si l'extension ne suffit pas")
+    parser.add_argument("--vin", action="append", help="VIN à exporter (répétable, tous par défaut)")
+    parser.add_argument("--start", type=_parse_date, help="date de début incluse (ISO, ex. 2025-01-01)")
+    parser.add_argument("--end", type=_parse_date, help="date de fin exclue pour les charges, incluse pour la télémétrie")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="charges lues et écrites par morceau")
+    parser.add_argument("--db", default=DB_PATH, help="base SQLite locale")
+    args = parser.parse_args()
+
+    fmt, compression = guess_format(args.output)
+    fmt = args.format or fmt
+    compression = args.compression or compression
+    if fmt is None:
+        parser.error("format de sortie inconnu : préciser --format ou une extension .csv, .jsonl ou .parquet")
+
+    if args.dataset == "charges":
+        store = ChargeStore(args.db)
+        frames = iter_charge_frames(store, args.vin or store.vins(), args.start, args.end, args.chunk_size,
+                                    reconstructor=GapReconstructor(args.db), telemetry=TelemetryStore(args.db))
+    else:
+        telemetry = TelemetryStore(args.db)
+        frames = iter_telemetry_frames(telemetry, args.dataset, args.vin or telemetry.vins(args.dataset), args.start, args.end)
+
+    try:
+        rows = write_frames(frames, args.output, fmt, compression)
+    except ImportError as exc:
+        parser.error(f"dépendance optionnelle manquante pour cette sortie : {exc.name} (pip install {exc.name})")
+    print(f"{rows} lignes exportées dans {args.output}", file=sys.stderr)
@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import aiohttp
+from renault_api.renault_client import RenaultClient
+from renault_api.exceptions import NotAuthenticatedException
+
+from analytics import AnalyticsStore
+from main import collect_vehicle_data
+from resilience import Resilience
+from telemetry import TelemetryStore
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_VEHICLES = 8 # nombre maximum de véhicules récupérés simultanément, tous comptes confondus
+CONNECTION_LIMIT = 20 # taille du pool de connexions HTTP partagé
+ACCOUNT_MIN_INTERVAL = 0.25 # délai minimum (en secondes) entre deux appels à l'API pour un même compte
+
+class RateLimiter:
+    """Espace les appels d'au moins 'min_interval' secondes (un limiteur par compte MyRenault)."""
+
+    def __init__(self, min_interval=ACCOUNT_MIN_INTERVAL):
+        self.min_interval = min_interval
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.min_interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class _RateLimitedVehicle:
+    """Enveloppe un RenaultVehicle : chaque appel asynchrone attend son tour auprès du limiteur du compte."""
+
+    def __init__(self, vehicle, limiter):
+        self._vehicle = vehicle
+        self._limiter = limiter
+
+    def __getattr__(self, name):
+        attr = getattr(self._vehicle, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        async def limited(*args, **kwargs):
+            await self._limiter.wait()
+            return await attr(*args, **kwargs)
+        return limited
+
+async def discover_vehicles(client):
+    """Retourne la liste (RenaultAccount, vehicle_link) de tous les véhicules de tous les comptes de la personne."""
+    persons = await client.get_person()
+    vehicles = []
+    for acc in persons.accounts:
+        account = await client.get_api_account(acc.accountId)
+        try:
+            vehicles_response = await account.get_vehicles()
+        except Exception as exc:
+            # certains types de compte ne portent aucun véhicule
+            logger.warning("Compte %s (%s) ignoré: %s", acc.accountId, acc.accountType, exc)
+            continue
+        for link in vehicles_response.vehicleLinks or []:
+            vehicles.append((account, link))
+    return vehicles
+
+async def collect_fleet(credentials, cache=None, charge_store=None, telemetry=None, analytics=None,
+                        max_concurrency=MAX_CONCURRENT_VEHICLES, min_interval=ACCOUNT_MIN_INTERVAL):
+    """
+    Récupère les données de tous les véhicules de plusieurs comptes MyRenault.
+    'credentials' est une liste de (email, mot de passe). Les véhicules sont récupérés en parallèle,
+    au plus 'max_concurrency' à la fois, sur un pool de connexions partagé et avec un limiteur
+    de débit par compte. Sans 'telemetry' et 'analytics', la consommation moyenne n'est pas calculée.
+    Retourne (données par VIN, erreurs par VIN ou par email).
+    """
+    results = {}
+    failures = {}
+    semaphore = asyncio.Semaphore(max_concurrency)
+    connector = aiohttp.TCPConnector(limit=CONNECTION_LIMIT)
+    resilience = Resilience(fatal=(NotAuthenticatedException,))
+
+    async def collect_vehicle(account, link, limiter):
+        async with semaphore:
+            try:
+                vehicle = await account.get_api_vehicle(link.vin)
+                results[link.vin] = await collect_vehicle_data(
+                    _RateLimitedVehicle(vehicle, limiter), link, cache=cache, charge_store=charge_store,
+                    telemetry=telemetry, analytics=analytics, resilience=resilience,
+                )
+            except Exception as exc:
+                failures[link.vin] = f"{type(exc).__name__}: {exc}"
+
+    async def collect_account(email, password):
+        # une session HTTP (et donc des cookies) par compte, mais un pool de connexions commun
+        async with aiohttp.ClientSession(connector=connector, connector_owner=False) as websession:
+            client = RenaultClient(websession=websession, locale="fr_FR")
+            try:
+                await client.session.login(email, password)
+                vehicles = await discover_vehicles(client)
+            except Exception as exc:
+                failures[email] = f"{type(exc).__name__}: {exc}"
+                return
+            limiter = RateLimiter(min_interval)
+            await asyncio.gather(*(collect_vehicle(account, link, limiter) for account, link in vehicles))
+
+    try:
+        await asyncio.gather(*(collect_account(email, password) for email, password in credentials))
+    finally:
+        await connector.close()
+    return results, failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Récupère les données de tous les véhicules de plusieurs comptes MyRenault.")
+    parser.add_argument("credentials", help='fichier JSON : [{"email": ..., "password": ...}, ...]')
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_VEHICLES)
+    args = parser.parse_args()
+
+    with open(args.credentials, encoding="utf-8") as f:
+        creds = [(c["email"], c["password"]) for c in json.load(f)]
+    vehicles, errors = asyncio.run(collect_fleet(creds, telemetry=TelemetryStore(), analytics=AnalyticsStore(),
+                                                 max_concurrency=args.concurrency))
+    for vin, data in vehicles.items():
+        print(f"{vin}: {data.state.battery_level} %, {data.state.kilometrage} km, {len(data.charges)} charges")
+    for key, error in errors.items():
+        print(f"{key}: échec ({error})")
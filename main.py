@@ -1,220 +1,279 @@
-import aiohttp
 import asyncio
-from renault_api.renault_client import RenaultClient
+import logging
+from renault_api.exceptions import NotAuthenticatedException
 from datetime import datetime, timedelta, timezone
-from zoneinfo import ZoneInfo
-
-USABLE_CAPACITY = 52.0 # capacité utile de la batterie
-DEFAULT_CHARGE_DURATION = 359 # durée de recharge utilisé lorsqu'une charge a été oubliée par l'API et qu'on l'ajoute de manière automatique et forcée
-
-def format_date(date_str: str) -> str:
-    # on transforme la date ISO en datetime
-    dt = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
-
-    # conversion de l'heure UTC au fuseau horaire de Paris
-    dt = dt.astimezone(ZoneInfo("Europe/Paris"))
-    
-    # noms des jours
-    jours = ["Lun.", "Mar.", "Mer.", "Jeu.", "Ven.", "Sam.", "Dim."]
-    jour_sem = jours[dt.weekday()]  # lundi = 0
-
-    # ajout des secondes avec %S
-    return f"{jour_sem} {dt.strftime('%d/%m à %Hh%M:%S')}"
-
-def shift_date(date_str: str, days: int = -1) -> str:
+from cache import cache_key
+from corrections import USABLE_CAPACITY, correct_charges
+from dates import format_date, parse_iso
+from metrics import METRICS, span
+from models import VehicleState, VehicleData
+from resilience import Resilience, retry
+
+logger = logging.getLogger(__name__)
+
+# délai maximum (en secondes) accordé à chaque endpoint avant de renoncer à sa section
+ENDPOINT_TIMEOUTS = {
+    "battery": 15,
+    "cockpit": 15,
+    "charges": 30,
+    "location": 15,
+}
+
+def _round_int(value):
+    return int(round(value, 0)) if value is not None else None
+
+async def _fetch_endpoint(name, fetch, errors, cache=None, key=None, force_refresh=False, resilience=None):
     """
-    Décale une date ISO8601 (UTC) de 'days' jours.
-    Exemple de date attendue : '2025-08-06T12:24:06Z'
+    Retourne la réponse brute (raw_data) d'un endpoint, depuis le cache si elle y est
+    encore fraîche, sinon en l'attendant avec son délai propre.
+    Avec une couche de résilience (voir resilience.Resilience), l'appel est réessayé, regroupé avec
+    les appels identiques en cours, et la dernière réponse valide est servie si l'API reste indisponible.
+    En cas d'échec ou de timeout, retourne None (ou la dernière réponse valide) et note l'erreur
+    dans 'errors' au lieu de faire échouer toute la récupération.
     """
-    dt = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
-    shifted = dt + timedelta(days=days)
-    return shifted.strftime("%Y-%m-%dT%H:%M:%SZ")
-
-async def get_renault_data(email, password):
-    async with aiohttp.ClientSession() as websession:
-        
-        client = RenaultClient(websession=websession, locale="fr_FR")
-
-        # Connecttion avec les identifiants MyRenault
-        await client.session.login(email, password)
-
-        # Liste des comptes liés
-        persons = await client.get_person()
-
-        # Récupération de mon account (type MYRENAULT)
-        my_account = None
-
-        for acc in persons.accounts:
-            if acc.accountType == "MYRENAULT":
-                my_account = acc
-                break  # on prend le premier trouvé, généralement il n'y en a qu'un
-
-        # Informations sur le compte
-        print("Account ID:", my_account.accountId)#79cc3eb8-1d72-4e2a-bca7-8b87d6934417
-        print("Type:", my_account.accountType)#MYRENAULT
-        print("Status:", my_account.accountStatus)#ACTIVE
-        print("First name:", persons.raw_data['firstName'])
-        print("Last name:", persons.raw_data['lastName'])
-        print("personId:", persons.raw_data['personId'])#7ededdb5-82a9-4ee8-a2cb-bf0c7c013cc7
-
-        # Instanciation de l'objet correspondant au compte
-        RenaultAccount = await client.get_api_account(my_account.accountId)
-        print(RenaultAccount)
-
-        # Récupération des véhicules
-        vehicles_response  = await RenaultAccount.get_vehicles()
-        first_vehicle = vehicles_response.vehicleLinks[0]
-        print("VIN: ", first_vehicle.vin)      # Numéro de série (VIN)
-        VIN = first_vehicle.vin
-
-        # Instanciation de l'objet correspondant au véhicule
-        RenaultVehicle = await RenaultAccount.get_api_vehicle(VIN)
-        print(RenaultVehicle)
-
-        # Récupération du niveau de la batterie
-        battery = await RenaultVehicle.get_battery_status()
-        print("Last update: ", format_date(str(battery.raw_data['timestamp'])))
-        print("Niveau de batterie actuel:", battery.raw_data['batteryLevel'], "%")
-        print("Autonomie restante:", battery.raw_data['batteryAutonomy'], "km")
-        computed_max_autonomy = battery.raw_data['batteryAutonomy'] * (1 / battery.raw_data['batteryLevel']) * 100 
-        print("Autonomie à 100% de charge", computed_max_autonomy)
-        print("Plug status:", battery.raw_data['plugStatus'])
-        print("Charging status:", battery.raw_data['chargingStatus'])
-        chargingPower = 0
-        print("Charging power:", chargingPower)
-
-        # Récupération des infos cockpit
-        cockpit = await RenaultVehicle._get_vehicle_data("cockpit")
-        kilometrage = cockpit.raw_data['data']['attributes']['totalMileage']
-        print("Kilométrage parcouru: ", kilometrage, "km")
-
-        # Récupération de l'historique de recharges
-        now = datetime.now(timezone.utc)
+    async def fetch_raw():
+        METRICS.count(f"request.{name}")
+        with span(f"endpoint.{name}"):
+            response = await asyncio.wait_for(fetch(), timeout=ENDPOINT_TIMEOUTS[name])
+        return response.raw_data
+
+    if cache is not None and not force_refresh:
+        raw_data = cache.get(key)
+        if raw_data is not None:
+            METRICS.count(f"cache_hit.{name}")
+            return raw_data
+
+    try:
+        if resilience is None:
+            raw_data, stale_since = await fetch_raw(), None
+        else:
+            raw_data, stale_since = await resilience.call(key, fetch_raw)
+        if stale_since is None:
+            if cache is not None:
+                cache.set(key, raw_data)
+        else:
+            errors[name] = f"API indisponible, données du {format_date(stale_since)}"
+            logger.warning("Endpoint %s indisponible, dernière réponse valide servie", name)
+        return raw_data
+    except NotAuthenticatedException:
+        # une authentification expirée concerne tous les endpoints : on laisse remonter
+        raise
+    except asyncio.TimeoutError:
+        errors[name] = f"timeout après {ENDPOINT_TIMEOUTS[name]}s"
+    except Exception as exc:
+        errors[name] = f"{type(exc).__name__}: {exc}"
+    logger.warning("Endpoint %s indisponible: %s", name, errors[name])
+    return None
+
+async def discover_vehicle(client):
+    """
+    Parcourt la chaîne personne -> compte MYRENAULT -> véhicules et retourne
+    (RenaultAccount, first_vehicle, RenaultVehicle) pour le premier véhicule du compte.
+    """
+    # Liste des comptes liés
+    persons = await client.get_person()
+
+    # Récupération de mon account (type MYRENAULT)
+    my_account = None
+
+    for acc in persons.accounts:
+        if acc.accountType == "MYRENAULT":
+            my_account = acc
+            break  # on prend le premier trouvé, généralement il n'y en a qu'un
+
+    # Informations sur le compte
+    logger.debug("Account ID: %s", my_account.accountId)#79cc3eb8-1d72-4e2a-bca7-8b87d6934417
+    logger.debug("Type: %s", my_account.accountType)#MYRENAULT
+    logger.debug("Status: %s", my_account.accountStatus)#ACTIVE
+    logger.debug("First name: %s", persons.raw_data['firstName'])
+    logger.debug("Last name: %s", persons.raw_data['lastName'])
+    logger.debug("personId: %s", persons.raw_data['personId'])#7ededdb5-82a9-4ee8-a2cb-bf0c7c013cc7
+
+    # Instanciation de l'objet correspondant au compte
+    RenaultAccount = await client.get_api_account(my_account.accountId)
+    logger.debug("%s", RenaultAccount)
+
+    # Récupération des véhicules
+    vehicles_response  = await RenaultAccount.get_vehicles()
+    first_vehicle = vehicles_response.vehicleLinks[0]
+    logger.info("VIN: %s", first_vehicle.vin)      # Numéro de série (VIN)
+
+    # Instanciation de l'objet correspondant au véhicule
+    RenaultVehicle = await RenaultAccount.get_api_vehicle(first_vehicle.vin)
+    logger.debug("%s", RenaultVehicle)
+
+    return RenaultAccount, first_vehicle, RenaultVehicle
+
+async def collect_vehicle_data(RenaultVehicle, first_vehicle, cache=None, force_refresh=False, charge_store=None,
+                               telemetry=None, analytics=None, resilience=None, reconstructor=None):
+    """
+    Récupère et met en forme les données d'un véhicule déjà identifié.
+    Ne paie que les appels de données, pas la connexion ni la découverte du compte.
+    Chaque composant est optionnel : 'cache' (endpoints encore frais, sauf force_refresh),
+    'charge_store' (synchronisation incrémentale de l'historique), 'telemetry' (relevés conservés),
+    'analytics' (consommation moyenne, None sans eux), 'resilience' (nouveaux essais et dernière
+    réponse valide) et 'reconstructor' (charges manquantes retrouvées dans la télémétrie).
+    """
+    VIN = first_vehicle.vin
+
+    # Récupération en parallèle des données du véhicule : aucun appel ne dépend d'un autre,
+    # un endpoint lent ou en erreur ne dégrade que sa propre section
+    now = datetime.now(timezone.utc)
+    if charge_store is not None:
+        start_date, end_date = charge_store.sync_window(VIN, now)
+        charges_key = cache_key(VIN, "charges", since=start_date.isoformat())
+    else:
         start_date = now - timedelta(days=30)
         end_date = now - timedelta(days=0)
-        charge_history = await RenaultVehicle.get_charges(start=start_date, end=end_date)
-
-        # Statistiques globales de charge
-        nb_charges = 0
-        total_energy_charged = 0
-        for charge in charge_history.raw_data['charges']:
-            if charge['chargeEnergyRecovered'] == 0:
-                continue
-            nb_charges += 1
-            total_energy_charged += charge['chargeEnergyRecovered']
-
-        print("Nombre de charges:", nb_charges)
-        print("Total énergie rechargée:", round(total_energy_charged, 2), "kWh")
-        avg_consumption = round(total_energy_charged / (kilometrage / 100), 2)
-        print("Consommation moyenne: ", avg_consumption, "kwh/100km")
-        computed_remaining_autonomy = int(battery.raw_data['batteryLevel'] * USABLE_CAPACITY / avg_consumption)
-        print("Autonomie restante (recalculée): ", computed_remaining_autonomy, "km")
-        computed_max_autonomy_real = computed_remaining_autonomy * (1 / battery.raw_data['batteryLevel']) * 100 
-        print("Autonomie restante réelle (recalculée): ", computed_max_autonomy_real, "km")
-
-        # Affichage de l'historique de charges
-        charges = charge_history.raw_data["charges"]#trier le dictionnaire par date de début de charge
-        charges.sort(
-            key=lambda x: datetime.fromisoformat(x['chargeStartDate'].replace("Z", "+00:00"))
-        )
-
-        custom_charges = []
-        previous_end_level = None
-        for charge in charge_history.raw_data['charges']:
-            if charge['chargeEnergyRecovered'] == 0:
-                continue
-
-            chargeStartBatteryLevel = charge['chargeStartBatteryLevel']
-            chargeEndBatteryLevel = charge['chargeEndBatteryLevel']
-            chargeEnergyRecovered = charge['chargeEnergyRecovered']
-            chargePercentRecovered = chargeEnergyRecovered / USABLE_CAPACITY * 100
-
-            # Correction manuelle à appliquer sur les données boguées
-            if (charge['chargeStartBatteryLevel'] == 0 or charge['chargeStartBatteryLevel'] == charge['chargeEndBatteryLevel']):
-                chargeStartBatteryLevel = int(round(charge['chargeEndBatteryLevel'] - chargePercentRecovered, 0))
-
-            # Affichage des données corrigées
-            charge_str = str("chargeStartDate: " + format_date(str(charge['chargeStartDate']))) + ", chargeEndDate: " + format_date(str(charge['chargeEndDate']))
-            charge_str += ", chargeStartBatteryLevel: " + str(int(round(chargeStartBatteryLevel))) + ", chargeEndBatteryLevel: " + str(int(round(chargeEndBatteryLevel)))
-            charge_str += ", chargeEnergyRecovered: " + str(round(charge['chargeEnergyRecovered'], 2)) + "kWh (+" + str(round(chargePercentRecovered, 2)) + "%)"
-            #print(charge_str)
-
-            # Correction manuelle si charge < 1min on considère qu'elle a durée 1min et pas "0"
-            charge_duration = charge['chargeDuration']
-            if charge_duration == 0:
-                charge_duration = 1
-
-            # Calcul de la puissance de charge (kW)
-            chargePower = chargeEnergyRecovered / (charge_duration / 60)
-            # print("Puissance de recharge: ", round(chargePower, 2), "kW")
-
-            # Correction manuelle : insertion manuelle de recharge manquante
-            if previous_end_level is not None and chargeStartBatteryLevel > previous_end_level:
-                percent_recovered = chargeStartBatteryLevel - previous_end_level
-                missing_energy = percent_recovered / 100 * USABLE_CAPACITY
-                
-                custom_charges.append({
-                    "chargeStartDate": shift_date(charge['chargeStartDate'], days=-1),
-                    "chargeEndDate": shift_date(charge['chargeEndDate'], days=-1),
-                    "chargeStartBatteryLevel": chargeStartBatteryLevel - percent_recovered,
-                    "chargeEndBatteryLevel": chargeStartBatteryLevel,
-                    "chargeEnergyRecovered": missing_energy,
-                    "chargePercentRecovered": round((missing_energy / USABLE_CAPACITY * 100), 2),
-                    "chargeDuration": DEFAULT_CHARGE_DURATION,
-                    "chargePower": missing_energy / (DEFAULT_CHARGE_DURATION / 60),
-                    "fakeCharge": True
-                })
-
-                nb_charges += 1
-                total_energy_charged += missing_energy
-
-            # Enregistrer les données corrigées et filtrées
-            custom_charges.append({
-                "chargeStartDate": charge['chargeStartDate'],
-                "chargeEndDate": charge['chargeEndDate'],
-                "chargeStartBatteryLevel": chargeStartBatteryLevel,
-                "chargeEndBatteryLevel": chargeEndBatteryLevel,
-                "chargeEnergyRecovered": chargeEnergyRecovered,
-                "chargePercentRecovered": round(chargePercentRecovered, 2),
-                "chargeDuration": charge_duration,
-                "chargePower": chargePower,
-                "fakeCharge": False
-            })
-
-            previous_end_level = chargeEndBatteryLevel
-
-        # Récupération de la position GPS
-        location = await RenaultVehicle._get_vehicle_data("location")
-        gps_data = {
-            "latitude": location.raw_data["data"]["attributes"]["gpsLatitude"],
-            "longitude": location.raw_data["data"]["attributes"]["gpsLongitude"]
-        }
-        print("Longitude: ", gps_data['longitude'])
-        print("Latitude: ", gps_data['latitude'])
-
-        # Insérer toutes les données récoltées dans un dictionnaire pour affichage dans une application :
-        data = {
-            "VIN": VIN,
-            "usable_capacity": USABLE_CAPACITY,
-            "last_update": format_date(str(battery.raw_data['timestamp'])),
-            "battery_level": battery.raw_data['batteryLevel'],
-            "battery_autonomy": battery.raw_data['batteryAutonomy'],
-            "battery_max_autonomy": int(round(computed_max_autonomy, 0)),
-            "battery_autonomy_estimation": int(round(computed_remaining_autonomy, 0)),
-            "battery_max_autonomy_real": int(round(computed_max_autonomy_real, 0)),
-            "plugStatus": battery.raw_data['plugStatus'],
-            "chargingStatus": battery.raw_data['chargingStatus'],
-            "chargingRemainingTime": battery.raw_data['chargingRemainingTime'],
-            "chargingPower": chargingPower,
-            "kilometrage": kilometrage,
-            "charge_stats": {
-                "nb_charges": nb_charges,
-                "total_energy_charged": round(total_energy_charged, 2),
-                "avg_consumption": avg_consumption
-            },
-            "gps": gps_data,
-            "charge_history": custom_charges,
-            "assets":  first_vehicle.raw_data["vehicleDetails"]["assets"]
-        }
-
-        return data
\ No newline at end of file
+        charges_key = cache_key(VIN, "charges", days=30)
+    errors = {}
+    options = {"cache": cache, "force_refresh": force_refresh, "resilience": resilience}
+    battery, cockpit, charge_history, location = await asyncio.gather(
+        _fetch_endpoint("battery", RenaultVehicle.get_battery_status, errors,
+                        key=cache_key(VIN, "battery"), **options),
+        _fetch_endpoint("cockpit", lambda: RenaultVehicle._get_vehicle_data("cockpit"), errors,
+                        key=cache_key(VIN, "cockpit"), **options),
+        _fetch_endpoint("charges", lambda: RenaultVehicle.get_charges(start=start_date, end=end_date), errors,
+                        key=charges_key, **options),
+        _fetch_endpoint("location", lambda: RenaultVehicle._get_vehicle_data("location"), errors,
+                        key=cache_key(VIN, "location"), **options),
+    )
+
+    if telemetry is not None:
+        telemetry.record(VIN, battery=battery, cockpit=cockpit, location=location, fetched_at=now)
+
+    # Niveau de la batterie
+    battery_data = battery if battery is not None else {}
+    battery_level = battery_data.get('batteryLevel')
+    battery_autonomy = battery_data.get('batteryAutonomy')
+    computed_max_autonomy = None
+    if battery_data.get('timestamp') is not None and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Last update: %s", format_date(str(battery_data['timestamp'])))
+    logger.debug("Niveau de batterie actuel: %s %%", battery_level)
+    logger.debug("Autonomie restante: %s km", battery_autonomy)
+    if battery_level and battery_autonomy is not None:
+        computed_max_autonomy = battery_autonomy * (1 / battery_level) * 100
+    logger.debug("Autonomie à 100%% de charge: %s", computed_max_autonomy)
+    logger.debug("Plug status: %s", battery_data.get('plugStatus'))
+    logger.debug("Charging status: %s", battery_data.get('chargingStatus'))
+    chargingPower = 0
+    logger.debug("Charging power: %s", chargingPower)
+
+    # Infos cockpit
+    kilometrage = None
+    if cockpit is not None:
+        kilometrage = cockpit['data']['attributes']['totalMileage']
+    logger.debug("Kilométrage parcouru: %s km", kilometrage)
+
+    # Historique de recharges
+    charges = charge_history['charges'] if charge_history is not None else []
+    if charge_store is not None:
+        new_charges = charge_store.merge(VIN, charges)
+        logger.info("Nouvelles charges synchronisées: %d", new_charges)
+        charges = charge_store.load(VIN)
+
+    # Corrections des charges (niveaux bogués, durées nulles, recharges manquantes),
+    # directement en tableau typé (dates datetime64, niveaux int8, énergies float32)
+    with span("corrections"):
+        charges_df = correct_charges(charges)
+    if reconstructor is not None and telemetry is not None:
+        with span("reconstruction"):
+            charges_df = reconstructor.reconstruct(VIN, charges_df, telemetry)
+
+    # Statistiques globales de charge
+    nb_charges = len(charges_df)
+    total_energy_charged = float(charges_df['chargeEnergyRecovered'].to_numpy().sum(dtype='float64'))
+
+    logger.debug("Nombre de charges: %d", nb_charges)
+    logger.debug("Total énergie rechargée: %.2f kWh", total_energy_charged)
+
+    # Consommation moyenne : énergie rechargée rapportée aux kilomètres parcourus sur la même période
+    avg_consumption = None
+    if analytics is not None and telemetry is not None:
+        with span("analytics"):
+            # première fois pour ce VIN : on intègre tout l'historique connu, ensuite seulement la fenêtre synchronisée
+            if analytics.has_charges(VIN):
+                analytics.update(VIN, charges_df[charges_df['chargeStartDate'] >= start_date], since=start_date)
+            else:
+                analytics.update(VIN, charges_df)
+            avg_consumption, window_days = analytics.consumption(VIN, telemetry, now=now)
+        logger.debug("Consommation moyenne: %s kwh/100km (sur %s jours)", avg_consumption, window_days)
+    computed_remaining_autonomy = None
+    computed_max_autonomy_real = None
+    if avg_consumption and battery_level:
+        computed_remaining_autonomy = int(battery_level * USABLE_CAPACITY / avg_consumption)
+        computed_max_autonomy_real = computed_remaining_autonomy * (1 / battery_level) * 100
+    logger.debug("Autonomie restante (recalculée): %s km", computed_remaining_autonomy)
+    logger.debug("Autonomie restante réelle (recalculée): %s km", computed_max_autonomy_real)
+
+    # Position GPS
+    latitude = longitude = None
+    if location is not None:
+        latitude = location["data"]["attributes"]["gpsLatitude"]
+        longitude = location["data"]["attributes"]["gpsLongitude"]
+        logger.debug("Position: %s, %s", latitude, longitude)
+
+    # Regrouper toutes les données récoltées pour affichage dans une application :
+    # état scalaire du véhicule d'un côté, historique de charges typé de l'autre
+    last_update = None
+    if battery_data.get('timestamp') is not None:
+        last_update = parse_iso(str(battery_data['timestamp']))
+    state = VehicleState(
+        vin=VIN,
+        usable_capacity=USABLE_CAPACITY,
+        last_update=last_update,
+        battery_level=battery_level,
+        battery_autonomy=battery_autonomy,
+        battery_max_autonomy=_round_int(computed_max_autonomy),
+        battery_autonomy_estimation=_round_int(computed_remaining_autonomy),
+        battery_max_autonomy_real=_round_int(computed_max_autonomy_real),
+        plug_status=battery_data.get('plugStatus'),
+        charging_status=battery_data.get('chargingStatus'),
+        charging_remaining_time=battery_data.get('chargingRemainingTime'),
+        charging_power=chargingPower,
+        kilometrage=kilometrage,
+        nb_charges=nb_charges,
+        total_energy_charged=round(total_energy_charged, 2),
+        avg_consumption=avg_consumption,
+        latitude=latitude,
+        longitude=longitude,
+    )
+
+    return VehicleData(
+        state=state,
+        charges=charges_df,
+        assets=first_vehicle.raw_data["vehicleDetails"]["assets"],
+        errors=errors,
+    )
+
+async def get_renault_data(email, password, client=None, telemetry=None, analytics=None, local_stores=False):
+    """
+    Connexion, découverte du véhicule et récupération de ses données.
+    'client' permet de fournir un client déjà construit (ex. replay.FakeRenaultClient pour un rejeu hors ligne).
+    La consommation moyenne se calcule sur les relevés accumulés dans 'telemetry' et 'analytics' ;
+    avec local_stores, ceux de la base locale (partagés par le processus, comme pour le tableau de bord)
+    sont utilisés. Jamais avec un client fourni : un rejeu n'écrit rien dans les séries réelles.
+    """
+    if local_stores and client is None and telemetry is None and analytics is None:
+        from session import get_shared_analytics, get_shared_telemetry
+
+        telemetry, analytics = get_shared_telemetry(), get_shared_analytics()
+    if client is None:
+        # imports différés : aiohttp et renault_api ne sont chargés qu'au premier appel réel
+        import aiohttp
+        from renault_api.renault_client import RenaultClient
+
+        async with aiohttp.ClientSession() as websession:
+            client = RenaultClient(websession=websession, locale="fr_FR")
+            return await get_renault_data(email, password, client=client, telemetry=telemetry, analytics=analytics)
+
+    # Connecttion avec les identifiants MyRenault
+    # (pas de nouvel essai : des identifiants refusés plusieurs fois peuvent bloquer le compte)
+    with span("login"):
+        await client.session.login(email, password)
+
+    with span("discovery"):
+        _, first_vehicle, RenaultVehicle = await retry(lambda: discover_vehicle(client), fatal=(NotAuthenticatedException,))
+    resilience = Resilience(fatal=(NotAuthenticatedException,))
+    return await collect_vehicle_data(RenaultVehicle, first_vehicle, telemetry=telemetry, analytics=analytics,
+                                      resilience=resilience)
@@ -0,0 +1,122 @@
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+PREFIX = "myr5"
+
+class Metrics:
+    """
+    Mesures du pipeline de récupération : durée de chaque étape (connexion, endpoints, corrections,
+    construction du payload, préparation de l'affichage), compteurs de requêtes et d'erreurs.
+    Exportables au format texte Prometheus ou en JSON.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = Counter()
+        self.errors = Counter()
+        self._durations = {} # étape -> [nombre, total, max]
+        self.latest = {} # étape -> durée de la dernière exécution (s)
+
+    @contextmanager
+    def span(self, stage):
+        """Mesure la durée du bloc ; une exception est comptée comme erreur de l'étape puis propagée."""
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.error(stage)
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            stats = self._durations.setdefault(stage, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+            self.latest[stage] = seconds
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def error(self, stage):
+        with self._lock:
+            self.errors[stage] += 1
+
+    def snapshot(self):
+        """État courant des mesures, sérialisable en JSON."""
+        with self._lock:
+            return {
+                "latest": dict(self.latest),
+                "durations": {stage: {"count": c, "total": t, "max": m} for stage, (c, t, m) in self._durations.items()},
+                "counters": dict(self.counters),
+                "errors": dict(self.errors),
+            }
+
+    def render_prometheus(self):
+        """Mesures au format d'exposition texte de Prometheus."""
+        data = self.snapshot()
+        lines = [
+            f"# HELP {PREFIX}_stage_duration_seconds Durée des étapes du pipeline de récupération.",
+            f"# TYPE {PREFIX}_stage_duration_seconds summary",
+        ]
+        for stage, stats in sorted(data["durations"].items()):
+            lines.append(f'{PREFIX}_stage_duration_seconds_count{{stage="{stage}"}} {stats["count"]}')
+            lines.append(f'{PREFIX}_stage_duration_seconds_sum{{stage="{stage}"}} {stats["total"]:.6f}')
+        lines += [
+            f"# HELP {PREFIX}_stage_last_duration_seconds Durée de la dernière exécution de chaque étape.",
+            f"# TYPE {PREFIX}_stage_last_duration_seconds gauge",
+        ]
+        for stage, seconds in sorted(data["latest"].items()):
+            lines.append(f'{PREFIX}_stage_last_duration_seconds{{stage="{stage}"}} {seconds:.6f}')
+        lines += [
+            f"# HELP {PREFIX}_events_total Requêtes envoyées à l'API et réponses servies par le cache.",
+            f"# TYPE {PREFIX}_events_total counter",
+        ]
+        for name, value in sorted(data["counters"].items()):
+            lines.append(f'{PREFIX}_events_total{{event="{name}"}} {value}')
+        lines += [
+            f"# HELP {PREFIX}_errors_total Erreurs par étape.",
+            f"# TYPE {PREFIX}_errors_total counter",
+        ]
+        for stage, value in sorted(data["errors"].items()):
+            lines.append(f'{PREFIX}_errors_total{{stage="{stage}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
+span = METRICS.span
+
+def serve_metrics(port, metrics=METRICS, host="127.0.0.1"):
+    """
+    Expose les mesures sur http://host:port/metrics (Prometheus) et /metrics.json,
+    dans un thread d'arrière-plan. Retourne le serveur (server.shutdown() pour l'arrêter).
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body, content_type = metrics.render_prometheus(), "text/plain; version=0.0.4"
+            elif self.path == "/metrics.json":
+                body, content_type = json.dumps(metrics.snapshot()), "application/json"
+            else:
+                self.send_error(404)
+                return
+            payload = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
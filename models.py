@@ -0,0 +1,87 @@
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+
+import pandas as pd
+
+# types compacts des colonnes de l'historique de charges
+CHARGE_DTYPES = {
+    "chargeStartDate": "datetime64[ns, UTC]",
+    "chargeEndDate": "datetime64[ns, UTC]",
+    "chargeStartBatteryLevel": "int8",
+    "chargeEndBatteryLevel": "int8",
+    "chargeEnergyRecovered": "float32",
+    "chargePercentRecovered": "float32",
+    "chargeDuration": "int32",
+    "chargePower": "float32",
+    "fakeCharge": "bool",
+}
+
+@dataclass(slots=True)
+class VehicleState:
+    """État scalaire du véhicule au moment de la récupération (None si l'endpoint était indisponible)."""
+    vin: str
+    usable_capacity: float
+    last_update: datetime | None = None
+    battery_level: int | None = None
+    battery_autonomy: int | None = None
+    battery_max_autonomy: int | None = None
+    battery_autonomy_estimation: int | None = None
+    battery_max_autonomy_real: int | None = None
+    plug_status: int | None = None
+    charging_status: float | None = None
+    charging_remaining_time: int | None = None
+    charging_power: float = 0
+    kilometrage: float | None = None
+    nb_charges: int = 0
+    total_energy_charged: float = 0
+    avg_consumption: float | None = None
+    latitude: float | None = None
+    longitude: float | None = None
+
+@dataclass(slots=True)
+class VehicleData:
+    """Données complètes d'un véhicule : état scalaire, historique de charges typé et visuels."""
+    state: VehicleState
+    charges: pd.DataFrame
+    assets: list = field(default_factory=list)
+    errors: dict = field(default_factory=dict)
+
+def to_charge_frame(charges):
+    """
+    Convertit des charges corrigées sous forme de dicts (voir corrections.correct_charges_reference,
+    GapReconstructor) en DataFrame typé, celui que retourne directement correct_charges :
+    dates datetime64 UTC, niveaux int8, énergie/puissance float32, fakeCharge bool.
+    """
+    df = pd.DataFrame(charges, columns=list(CHARGE_DTYPES))
+    for column in ("chargeStartDate", "chargeEndDate"):
+        df[column] = pd.to_datetime(df[column], utc=True, format="ISO8601")
+    for column in ("chargeStartBatteryLevel", "chargeEndBatteryLevel", "chargeDuration"):
+        df[column] = df[column].round()
+    return df.astype(CHARGE_DTYPES)
+
+def payload_to_dict(data):
+    """Représentation JSON de VehicleData (dates ISO, historique de charges en colonnes)."""
+    state = asdict(data.state)
+    if data.state.last_update is not None:
+        state["last_update"] = data.state.last_update.isoformat()
+    charges = data.charges.copy()
+    for column in ("chargeStartDate", "chargeEndDate"):
+        charges[column] = charges[column].dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return {
+        "state": state,
+        "charges": charges.to_dict("list"),
+        "assets": data.assets,
+        "errors": data.errors,
+    }
+
+def payload_from_dict(payload):
+    """Reconstruit VehicleData (avec ses types compacts) depuis payload_to_dict."""
+    state = dict(payload["state"])
+    if state.get("last_update") is not None:
+        state["last_update"] = datetime.fromisoformat(state["last_update"])
+    return VehicleData(
+        state=VehicleState(**state),
+        charges=to_charge_frame(payload["charges"]),
+        assets=payload.get("assets", []),
+        errors=payload.get("errors", {}),
+    )
@@ -0,0 +1,89 @@
+import argparse
+import logging
+import os
+import time
+import tomllib
+from datetime import datetime, timezone
+
+from metrics import METRICS, serve_metrics
+from session import get_session_manager
+from snapshot import SNAPSHOT_PATH, write_snapshot
+
+INTERVAL_CHARGING = 60 # véhicule en charge : le niveau bouge vite
+INTERVAL_PLUGGED = 300 # branché sans charger (charge planifiée, fin de charge)
+INTERVAL_PARKED = 1800 # débranché : rien ne change tant qu'on ne roule pas
+INTERVAL_ERROR = 120 # nouvel essai après une récupération en échec
+
+SECRETS_PATH = os.path.join(".streamlit", "secrets.toml")
+
+logger = logging.getLogger(__name__)
+
+def get_poller_creds():
+    """Identifiants depuis MYRENAULT_EMAIL / MYRENAULT_PASSWORD, sinon depuis la section [myrenault] de secrets.toml."""
+    email = os.environ.get("MYRENAULT_EMAIL")
+    password = os.environ.get("MYRENAULT_PASSWORD")
+    if email and password:
+        return email, password
+    try:
+        with open(SECRETS_PATH, "rb") as f:
+            section = tomllib.load(f).get("myrenault", {})
+    except FileNotFoundError:
+        return None
+    if section.get("email") and section.get("password"):
+        return section["email"], section["password"]
+    return None
+
+def next_interval(state):
+    """Délai avant la prochaine récupération, adapté à l'état de charge du véhicule."""
+    if state.charging_status == 1.0:
+        return INTERVAL_CHARGING
+    if state.plug_status == 1:
+        return INTERVAL_PLUGGED
+    return INTERVAL_PARKED
+
+def poll_once(manager, path=SNAPSHOT_PATH):
+    """
+    Récupère les données fraîches, publie l'instantané et retourne le délai avant la suivante.
+    Les durées des étapes de cette récupération sont jointes à l'instantané (meta["timings"]).
+    """
+    data = manager.get_data(force_refresh=True)
+    interval = next_interval(data.state)
+    write_snapshot(data, path, meta={
+        "fetched_at": datetime.now(timezone.utc).isoformat(),
+        "next_poll_in": interval,
+        "timings": METRICS.snapshot()["latest"],
+    })
+    return interval
+
+def run(email, password, path=SNAPSHOT_PATH, once=False):
+    while True:
+        try:
+            # la connexion est vérifiée à la création : un échec au démarrage est retenté comme les autres
+            manager = get_session_manager(email, password)
+            interval = poll_once(manager, path)
+            logger.info("Instantané publié dans %s, prochaine récupération dans %ds", path, interval)
+        except Exception as exc:
+            if once:
+                raise
+            interval = INTERVAL_ERROR
+            METRICS.error("poll")
+            logger.warning("Récupération en échec (%s: %s), nouvel essai dans %ds", type(exc).__name__, exc, interval)
+        if once:
+            return
+        time.sleep(interval)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Récupère périodiquement les données Renault et publie un instantané pour le tableau de bord.")
+    parser.add_argument("--snapshot", default=SNAPSHOT_PATH, help="fichier de l'instantané publié")
+    parser.add_argument("--once", action="store_true", help="une seule récupération puis arrêt")
+    parser.add_argument("--metrics-port", type=int, help="expose les mesures sur http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--log-level", default="INFO", help="niveau de journalisation (DEBUG pour le détail des relevés)")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    creds = get_poller_creds()
+    if creds is None:
+        parser.error("identifiants introuvables (MYRENAULT_EMAIL/MYRENAULT_PASSWORD ou .streamlit/secrets.toml)")
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+    run(*creds, path=args.snapshot, once=args.once)
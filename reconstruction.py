@@ -0,0 +1,146 @@
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+from corrections import USABLE_CAPACITY
+from models import to_charge_frame
+from storage import DB_PATH, connect
+
+MIN_RISE = 3 # hausse minimale (en %) du niveau de batterie pour retenir une charge dans un trou
+
+class GapReconstructor:
+    """
+    Reconstitution des charges oubliées par l'API à partir des relevés de batterie.
+    correct_charges ajoute une charge "fakeCharge" (la veille, durée fixe) quand une charge démarre
+    plus haut que la précédente ne s'est terminée. Ici, chaque trou (fin de la charge précédente ->
+    début de la suivante) est parcouru dans la télémétrie : chaque montée du niveau de batterie devient
+    une charge, avec ses dates, niveaux et puissance estimés. Sans montée visible (pas de relevés sur
+    la période, ou véhicule non branché), la charge ajoutée par correct_charges est conservée.
+    Les relevés passés ne changeant plus, le résultat d'un trou est mémorisé par (VIN, début, fin du trou)
+    dès qu'il est définitif (charge trouvée, ou télémétrie allant au-delà de la fin du trou) : seuls
+    les trous nouveaux ou encore ouverts coûtent une requête.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self._db = connect(path)
+        self._lock = threading.Lock()
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS reconstructed_gaps (
+                vin TEXT NOT NULL,
+                gap_start TEXT NOT NULL,
+                gap_end TEXT NOT NULL,
+                charges TEXT NOT NULL,
+                PRIMARY KEY (vin, gap_start, gap_end)
+            ) WITHOUT ROWID
+        """)
+        self._db.commit()
+        self._known = {} # VIN -> {(début, fin): charges reconstituées}, miroir de la table
+
+    def reconstruct(self, vin, charges, telemetry, previous_end_date=None):
+        """
+        Remplace les charges ajoutées de 'charges' (sortie de correct_charges) par les charges
+        reconstituées depuis la télémétrie quand elle en montre. Retourne un DataFrame de même forme.
+        'previous_end_date' est la fin de la charge qui précède 'charges' (historique lu par morceaux).
+        """
+        if charges.empty or not charges["fakeCharge"].any():
+            return charges
+        known = self._load(vin)
+        fake = charges["fakeCharge"].to_numpy()
+        ends = charges["chargeEndDate"].to_numpy()
+        starts = charges["chargeStartDate"].to_numpy()
+        pieces = []
+        done = 0
+        for i in np.flatnonzero(fake):
+            # une charge ajoutée précède toujours la charge réelle qui a révélé le trou ;
+            # en tête d'historique, la fin de la charge précédente est inconnue
+            previous_end = ends[i - 1] if i > 0 else previous_end_date
+            if previous_end is None or (i > 0 and fake[i - 1]) or i + 1 >= len(fake):
+                continue
+            key = (_iso(previous_end), _iso(starts[i + 1]))
+            found = known.get(key)
+            if found is None:
+                found = self._analyse(vin, key, telemetry)
+            if found:
+                pieces += [charges.iloc[done:i], to_charge_frame(found)]
+                done = i + 1
+        if not pieces:
+            return charges
+        pieces.append(charges.iloc[done:])
+        return pd.concat(pieces, ignore_index=True)
+
+    def _analyse(self, vin, key, telemetry):
+        gap_start, gap_end = key
+        readings = telemetry.query(
+            "battery", vin, start=pd.Timestamp(gap_start).to_pydatetime(), end=pd.Timestamp(gap_end).to_pydatetime(),
+            max_points=0,
+        )
+        found = rising_runs(readings)
+        if not found:
+            # sans charge visible, le trou n'est réglé que si la télémétrie va déjà au-delà de sa fin :
+            # sinon ses relevés peuvent encore arriver (relève en retard, import) et il sera réanalysé
+            reached = telemetry.last_reading_time("battery", vin)
+            if reached is None or reached < pd.Timestamp(gap_end):
+                return found
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO reconstructed_gaps VALUES (?, ?, ?, ?)",
+                             (vin, gap_start, gap_end, json.dumps(found)))
+            self._db.commit()
+        self._known[vin][key] = found
+        return found
+
+    def _load(self, vin):
+        if vin not in self._known:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT gap_start, gap_end, charges FROM reconstructed_gaps WHERE vin = ?", (vin,)
+                ).fetchall()
+            self._known[vin] = {(start, end): json.loads(data) for start, end, data in rows}
+        return self._known[vin]
+
+def rising_runs(readings, min_rise=MIN_RISE, capacity=USABLE_CAPACITY):
+    """
+    Charges estimées à partir des relevés de batterie (TelemetryStore.query, indexés par la date) :
+    chaque suite de relevés croissants d'au moins 'min_rise' % pris véhicule branché (plug_status 1)
+    donne une charge qui commence au dernier relevé bas et se termine au relevé le plus haut.
+    Une hausse sans branchement (recalibrage de la jauge, freinage régénératif) n'est pas une charge.
+    """
+    readings = readings.dropna(subset=["battery_level"])
+    charges = []
+    values = readings["battery_level"].to_numpy()
+    plugged = (readings["plug_status"] == 1).to_numpy()
+    times = readings.index
+    i = 0
+    while i < len(values) - 1:
+        # la charge démarre au dernier relevé bas et se termine au premier relevé le plus haut
+        while i + 1 < len(values) and values[i + 1] <= values[i]:
+            i += 1
+        j = i
+        while j + 1 < len(values) and values[j + 1] >= values[j] and plugged[j + 1]:
+            j += 1
+        top = j
+        while top > i and values[top - 1] == values[top]:
+            top -= 1
+        rise = values[top] - values[i]
+        if rise >= min_rise:
+            start, end = times[i], times[top]
+            duration = max(1, round((end - start).total_seconds() / 60))
+            energy = rise / 100 * capacity
+            charges.append({
+                "chargeStartDate": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "chargeEndDate": end.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "chargeStartBatteryLevel": int(values[i]),
+                "chargeEndBatteryLevel": int(values[top]),
+                "chargeEnergyRecovered": energy,
+                "chargePercentRecovered": round(float(rise), 2),
+                "chargeDuration": duration,
+                "chargePower": energy / (duration / 60),
+                "fakeCharge": True,
+            })
+        i = max(j, i + 1)
+    return charges
+
+def _iso(date):
+    """Date (Timestamp de l'historique typé) en chaîne ISO, clé des trous mémorisés."""
+    return pd.Timestamp(date).strftime("%Y-%m-%dT%H:%M:%SZ")
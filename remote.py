@@ -0,0 +1,92 @@
+import json
+import urllib.error
+import urllib.parse
+import urllib.request
+
+REQUEST_TIMEOUT = 120 # délai maximum d'attente d'une réponse du serveur
+
+class RemoteError(Exception):
+    """Réponse en erreur du serveur ; 'status' vaut 401 quand le jeton n'est plus valide."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class RemoteSession:
+    """
+    Client du serveur partagé (server.py) : même interface get_data que RenaultSessionManager,
+    mais la récupération est faite par le serveur. Seul le jeton de session est conservé,
+    jamais le mot de passe.
+    """
+
+    def __init__(self, url, token=None, access_key=None, timeout=REQUEST_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.access_key = access_key
+        self.timeout = timeout
+
+    def login(self, email, password):
+        """Ouvre une session sur le serveur et retourne les premières données du véhicule."""
+        body = self._request("POST", "/sessions", {"email": email, "password": password})
+        self.token = body["token"]
+        return _vehicle_data(body["data"])
+
+    def get_data(self, force_refresh=False):
+        return _vehicle_data(self._request("GET", "/data?force_refresh=1" if force_refresh else "/data"))
+
+    def battery_telemetry(self, start=None):
+        """Relevés de batterie du véhicule (sous-échantillonnés), comme TelemetryStore.query."""
+        import pandas as pd
+
+        path = "/telemetry/battery"
+        if start is not None:
+            path += "?" + urllib.parse.urlencode({"start": start.strftime("%Y-%m-%dT%H:%M:%SZ")})
+        df = pd.DataFrame(self._request("GET", path))
+        df.index = pd.to_datetime(df.pop("time"), utc=True)
+        return df.astype(float)
+
+    def charge_analytics(self):
+        """(énergie par mois, charges par tranche de puissance), comme AnalyticsStore.energy / power_bands."""
+        import pandas as pd
+
+        body = self._request("GET", "/analytics")
+        return pd.DataFrame(body["monthly"]).set_index("bucket"), pd.DataFrame(body["bands"]).set_index("band")
+
+    def thumbnail(self, index, width):
+        """Vignette (octets) du visuel n° 'index' du véhicule, ou None si le serveur ne l'a pas encore."""
+        try:
+            return self._request("GET", f"/assets/{index}?width={width}", raw=True)
+        except RemoteError as exc:
+            if exc.status == 404:
+                return None
+            raise
+
+    def logout(self):
+        if self.token is not None:
+            self._request("DELETE", "/sessions")
+            self.token = None
+
+    def _request(self, method, path, body=None, raw=False):
+        headers = {"Accept": "application/json"}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        if self.access_key is not None:
+            headers["X-Access-Key"] = self.access_key
+        if self.token is not None:
+            headers["Authorization"] = f"Bearer {self.token}"
+        request = urllib.request.Request(self.url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                content = response.read()
+        except urllib.error.HTTPError as exc:
+            raise RemoteError(exc.code, exc.read().decode(errors="replace") or exc.reason) from None
+        if raw:
+            return content
+        return json.loads(content) if content else None
+
+def _vehicle_data(payload):
+    from models import payload_from_dict
+
+    return payload_from_dict(payload)
@@ -0,0 +1,204 @@
+import asyncio
+import bisect
+import json
+import random
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+ISO_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+MAX_HISTORY_YEARS = 50
+
+class ReplayError(Exception):
+    """Erreur simulée par le client de rejeu."""
+
+async def record_fixture(email, password, path, days=30):
+    """
+    Enregistre dans 'path' les réponses brutes de l'API réelle : personne, véhicules de chaque compte,
+    puis batterie, cockpit, charges des 'days' derniers jours et position de chaque véhicule.
+    """
+    import aiohttp
+    from renault_api.renault_client import RenaultClient
+
+    async with aiohttp.ClientSession() as websession:
+        client = RenaultClient(websession=websession, locale="fr_FR")
+        await client.session.login(email, password)
+        person = await client.get_person()
+        fixture = {"person": person.raw_data, "accounts": {}, "vehicles": {}}
+        for acc in person.accounts:
+            account = await client.get_api_account(acc.accountId)
+            try:
+                vehicles = await account.get_vehicles()
+            except Exception:
+                continue
+            fixture["accounts"][acc.accountId] = vehicles.raw_data
+            for link in vehicles.vehicleLinks or []:
+                vehicle = await account.get_api_vehicle(link.vin)
+                now = datetime.now(timezone.utc)
+                fixture["vehicles"][link.vin] = {
+                    "battery": (await vehicle.get_battery_status()).raw_data,
+                    "cockpit": (await vehicle._get_vehicle_data("cockpit")).raw_data,
+                    "charges": (await vehicle.get_charges(start=now - timedelta(days=days), end=now)).raw_data,
+                    "location": (await vehicle._get_vehicle_data("location")).raw_data,
+                }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fixture, f, indent=2)
+
+def load_fixture(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def synthetic_charges(n, seed=0, end=None, spacing_hours=40):
+    """
+    Historique de 'n' charges brutes plausibles se terminant à 'end', avec la proportion habituelle
+    de données boguées (niveau de départ à 0 ou égal au niveau de fin, durée nulle, charge sans énergie)
+    et quelques recharges manquantes.
+    """
+    rng = random.Random(seed)
+    end = end or datetime.now(timezone.utc)
+    # les très gros historiques sont resserrés pour rester dans la plage des datetime64[ns] de pandas
+    spacing_hours = min(spacing_hours, MAX_HISTORY_YEARS * 365 * 24 / max(n, 1))
+    start = end - timedelta(hours=spacing_hours * n)
+    charges = []
+    level = 50
+    for i in range(n):
+        begin = start + timedelta(hours=spacing_hours * i + rng.uniform(0, spacing_hours / 2))
+        level = max(5, level - rng.randint(5, 40)) # conduite depuis la charge précédente
+        if rng.random() < 0.05:
+            level = min(95, level + rng.randint(5, 30)) # charge oubliée par l'API
+        end_level = min(100, level + rng.randint(5, 70))
+        duration = rng.choice([0, rng.randint(20, 600)])
+        energy = round((end_level - level) / 100 * 52.0 * rng.uniform(0.95, 1.05), 3)
+        start_level = level
+        if rng.random() < 0.1:
+            start_level = rng.choice([0, end_level])
+        if rng.random() < 0.02:
+            energy = 0
+        charges.append({
+            "chargeStartDate": begin.strftime(ISO_FORMAT),
+            "chargeEndDate": (begin + timedelta(minutes=duration)).strftime(ISO_FORMAT),
+            "chargeDuration": duration,
+            "chargeStartBatteryLevel": start_level,
+            "chargeEndBatteryLevel": end_level,
+            "chargeEnergyRecovered": energy,
+            "chargeEndStatus": "ok",
+        })
+        level = end_level
+    return charges
+
+def synthetic_fixture(n_charges=200, seed=0, vin="VF1SYNTHETIC00001", now=None):
+    """Jeu de réponses complet (personne, compte, véhicule, endpoints) généré, sans identifiants réels."""
+    now = now or datetime.now(timezone.utc)
+    account_id = "00000000-0000-0000-0000-000000000001"
+    return {
+        "person": {
+            "personId": "00000000-0000-0000-0000-000000000000",
+            "firstName": "Test",
+            "lastName": "Replay",
+            "accounts": [{"accountId": account_id, "accountType": "MYRENAULT", "accountStatus": "ACTIVE"}],
+        },
+        "accounts": {
+            account_id: {"vehicleLinks": [{"vin": vin, "vehicleDetails": {"assets": []}}]},
+        },
+        "vehicles": {
+            vin: {
+                "battery": {
+                    "timestamp": now.strftime(ISO_FORMAT),
+                    "batteryLevel": 64,
+                    "batteryAutonomy": 240,
+                    "plugStatus": 0,
+                    "chargingStatus": 0.0,
+                    "chargingRemainingTime": None,
+                },
+                "cockpit": {"data": {"attributes": {"totalMileage": 12345.6}}},
+                "charges": {"charges": synthetic_charges(n_charges, seed=seed, end=now)},
+                "location": {"data": {"attributes": {
+                    "gpsLatitude": 48.8566,
+                    "gpsLongitude": 2.3522,
+                    "lastUpdateTime": now.strftime(ISO_FORMAT),
+                }}},
+            },
+        },
+    }
+
+class FakeRenaultClient:
+    """
+    Remplaçant local de RenaultClient qui rejoue un jeu de réponses (voir record_fixture / synthetic_fixture),
+    avec une latence, une gigue et un taux d'erreur configurables. 'errors' permet de fixer le taux
+    d'erreur par endpoint (ex. {"location": 1.0}). 'calls' compte les appels par endpoint.
+    """
+
+    def __init__(self, fixture, latency=0.0, jitter=0.0, error_rate=0.0, errors=None, seed=None):
+        self.fixture = fixture
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.errors = errors or {}
+        self.calls = Counter()
+        self.session = SimpleNamespace(login=self._login)
+        self._rng = random.Random(seed)
+
+    async def respond(self, endpoint, raw_data):
+        self.calls[endpoint] += 1
+        delay = self.latency + self._rng.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self._rng.random() < self.errors.get(endpoint, self.error_rate):
+            raise ReplayError(f"erreur simulée sur {endpoint}")
+        return SimpleNamespace(raw_data=raw_data)
+
+    async def _login(self, email, password):
+        await self.respond("login", None)
+
+    async def get_person(self):
+        response = await self.respond("person", self.fixture["person"])
+        response.accounts = [SimpleNamespace(**acc) for acc in self.fixture["person"]["accounts"]]
+        return response
+
+    async def get_api_account(self, account_id):
+        return _FakeAccount(self, account_id)
+
+class _FakeAccount:
+    def __init__(self, client, account_id):
+        self._client = client
+        self.account_id = account_id
+
+    async def get_vehicles(self):
+        raw_data = self._client.fixture["accounts"][self.account_id]
+        response = await self._client.respond("vehicles", raw_data)
+        response.vehicleLinks = [SimpleNamespace(vin=link["vin"], raw_data=link) for link in raw_data["vehicleLinks"]]
+        return response
+
+    async def get_api_vehicle(self, vin):
+        return _FakeVehicle(self._client, vin)
+
+class _FakeVehicle:
+    def __init__(self, client, vin):
+        self._client = client
+        self.vin = vin
+        self._data = client.fixture["vehicles"][vin]
+        self._charges = sorted(self._data["charges"]["charges"], key=lambda c: c["chargeStartDate"])
+        self._starts = [c["chargeStartDate"] for c in self._charges]
+
+    async def get_battery_status(self):
+        return await self._client.respond("battery", self._data["battery"])
+
+    async def _get_vehicle_data(self, endpoint):
+        return await self._client.respond(endpoint, self._data[endpoint])
+
+    async def get_charges(self, start, end):
+        # les dates ISO UTC se comparent comme des chaînes : la fenêtre se trouve par dichotomie
+        lo = bisect.bisect_left(self._starts, start.strftime(ISO_FORMAT))
+        hi = bisect.bisect_right(self._starts, end.strftime(ISO_FORMAT))
+        return await self._client.respond("charges", {"charges": self._charges[lo:hi]})
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Enregistre les réponses de l'API MyRenault pour un rejeu hors ligne.")
+    parser.add_argument("email")
+    parser.add_argument("password")
+    parser.add_argument("output", help="fichier JSON des réponses enregistrées")
+    parser.add_argument("--days", type=int, default=30, help="profondeur de l'historique de charges enregistré")
+    args = parser.parse_args()
+    asyncio.run(record_fixture(args.email, args.password, args.output, days=args.days))
@@ -0,0 +1,187 @@
+import asyncio
+import concurrent.futures
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+from metrics import METRICS
+
+RETRY_ATTEMPTS = 3 # nombre total d'essais d'un appel
+BACKOFF_BASE = 0.5 # délai (s) avant le deuxième essai, doublé à chaque essai suivant
+BACKOFF_MAX = 8.0
+FAILURE_THRESHOLD = 3 # échecs consécutifs (après nouveaux essais) qui ouvrent le disjoncteur
+RESET_TIMEOUT = 60 # durée (s) pendant laquelle un disjoncteur ouvert n'envoie plus d'appel
+
+class CircuitOpenError(Exception):
+    """Disjoncteur ouvert et aucune donnée connue à servir à la place."""
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX, rng=random):
+    """Délai avant le nouvel essai n° 'attempt' (à partir de 0) : exponentiel, tiré au hasard entre 0 et le plafond."""
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
+
+async def retry(fetch, attempts=RETRY_ATTEMPTS, base=BACKOFF_BASE, cap=BACKOFF_MAX, fatal=(), name=None):
+    """
+    Attend fetch() en le relançant après un délai croissant en cas d'échec.
+    Les exceptions 'fatal' (ex. authentification expirée) remontent sans nouvel essai.
+    """
+    for attempt in range(attempts):
+        try:
+            return await fetch()
+        except fatal:
+            raise
+        except Exception:
+            if attempt == attempts - 1:
+                raise
+            if name is not None:
+                METRICS.count(f"retry.{name}")
+            await asyncio.sleep(backoff_delay(attempt, base, cap))
+
+class CircuitBreaker:
+    """
+    Disjoncteur : après 'failure_threshold' échecs consécutifs, les appels sont refusés
+    pendant 'reset_timeout' secondes, puis un seul appel d'essai est autorisé ; son succès
+    referme le disjoncteur, son échec le rouvre.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if self._clock() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = self._clock()
+            self._trial = False
+
+    def release(self):
+        """Libère l'essai en cours sans conclure (appel interrompu ou erreur étrangère à l'API)."""
+        with self._lock:
+            self._trial = False
+
+class SingleFlight:
+    """
+    Regroupe les appels simultanés portant sur la même clé : le premier appelant exécute la requête,
+    les suivants attendent son résultat. Fonctionne entre boucles asyncio de threads différents
+    (un gestionnaire de session par compte).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    async def do(self, key, fetch):
+        with self._lock:
+            future = self._calls.get(key)
+            owner = future is None
+            if owner:
+                future = self._calls[key] = concurrent.futures.Future()
+        if not owner:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+class Resilience:
+    """
+    Couche de résilience des appels de données : nouveaux essais espacés, disjoncteur par
+    (VIN, endpoint) et regroupement des requêtes identiques simultanées. Quand l'appel échoue
+    ou que le disjoncteur est ouvert, la dernière réponse valide est servie à la place.
+    Les clés sont celles de cache.cache_key : (VIN, endpoint, paramètres).
+    """
+
+    def __init__(self, attempts=RETRY_ATTEMPTS, base=BACKOFF_BASE, cap=BACKOFF_MAX,
+                 failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, fatal=()):
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.fatal = fatal
+        self.flights = SingleFlight()
+        self._breakers = {}
+        self._last_good = {} # (VIN, endpoint) -> (valeur, date de récupération)
+        self._lock = threading.Lock()
+
+    def breaker(self, vin, endpoint):
+        with self._lock:
+            breaker = self._breakers.get((vin, endpoint))
+            if breaker is None:
+                breaker = self._breakers[(vin, endpoint)] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return breaker
+
+    async def call(self, key, fetch):
+        """
+        Retourne (valeur, None) pour une réponse fraîche, ou (dernière valeur valide, date de sa récupération)
+        si l'API est indisponible. Sans valeur connue, l'erreur remonte (CircuitOpenError si le disjoncteur est ouvert).
+        """
+        return await self.flights.do(key, lambda: self._call(key, fetch))
+
+    async def _call(self, key, fetch):
+        vin, endpoint, _ = key
+        breaker = self.breaker(vin, endpoint)
+        if not breaker.allow():
+            METRICS.count(f"circuit_open.{endpoint}")
+            return self._fallback(vin, endpoint, CircuitOpenError(f"disjoncteur ouvert pour {endpoint}"))
+        try:
+            value = await retry(fetch, self.attempts, self.base, self.cap, fatal=self.fatal, name=endpoint)
+        except (asyncio.CancelledError, *self.fatal):
+            # ni succès ni panne de l'API : l'essai du disjoncteur semi-ouvert reste à faire
+            breaker.release()
+            raise
+        except Exception as exc:
+            breaker.record_failure()
+            return self._fallback(vin, endpoint, exc)
+        breaker.record_success()
+        with self._lock:
+            self._last_good[(vin, endpoint)] = (value, datetime.now(timezone.utc))
+        return value, None
+
+    def _fallback(self, vin, endpoint, exc):
+        with self._lock:
+            last_good = self._last_good.get((vin, endpoint))
+        if last_good is None:
+            raise exc
+        METRICS.count(f"stale.{endpoint}")
+        return last_good
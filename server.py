@@ -0,0 +1,285 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from aiohttp import web
+
+from assets import THUMBNAIL_WIDTH
+from dates import parse_iso
+from metrics import METRICS, span
+from models import payload_to_dict
+from session import get_session_manager, get_shared_analytics, get_shared_asset_cache, get_shared_telemetry
+from storage import DATA_DIR, DB_PATH, connect
+
+KEY_PATH = os.path.join(DATA_DIR, "server.key") # clé de chiffrement des mots de passe, si MYR5_SECRET_KEY n'est pas défini
+TOKEN_TTL = 30 * 24 * 3600 # durée de validité (en secondes) d'un jeton de session
+WORKERS = 8 # récupérations menées en parallèle, tous utilisateurs confondus
+
+logger = logging.getLogger(__name__)
+
+class CredentialStore:
+    """
+    Identifiants MyRenault des utilisateurs du serveur : les mots de passe sont chiffrés (Fernet)
+    avant d'être écrits dans la base, et les clients ne reçoivent qu'un jeton opaque dont seule
+    l'empreinte SHA-256 est conservée. Un jeton ne donne accès qu'aux données de son compte.
+    """
+
+    def __init__(self, path=DB_PATH, key=None, token_ttl=TOKEN_TTL):
+        from cryptography.fernet import Fernet
+
+        self._fernet = Fernet(key or load_key())
+        self.token_ttl = token_ttl
+        self._db = connect(path)
+        self._lock = threading.Lock()
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS server_credentials (
+                email TEXT PRIMARY KEY,
+                password BLOB NOT NULL
+            )
+        """)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS server_tokens (
+                token_hash TEXT PRIMARY KEY,
+                email TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+        self._db.commit()
+
+    def add(self, email, password):
+        """Enregistre (ou met à jour) les identifiants et retourne un nouveau jeton pour ce compte."""
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO server_credentials VALUES (?, ?)",
+                             (email, self._fernet.encrypt(password.encode())))
+            self._db.execute("INSERT INTO server_tokens VALUES (?, ?, ?)", (_token_hash(token), email, time.time()))
+            self._db.commit()
+        return token
+
+    def resolve(self, token):
+        """(email, mot de passe) associés à ce jeton, ou None s'il est inconnu ou expiré."""
+        with self._lock:
+            row = self._db.execute("""
+                SELECT c.email, c.password FROM server_tokens t
+                JOIN server_credentials c ON c.email = t.email
+                WHERE t.token_hash = ? AND t.created >= ?
+            """, (_token_hash(token), time.time() - self.token_ttl)).fetchone()
+        if row is None:
+            return None
+        return row[0], self._fernet.decrypt(row[1]).decode()
+
+    def revoke(self, token):
+        """Invalide ce jeton ; les identifiants sont effacés quand plus aucun jeton ne les utilise."""
+        with self._lock:
+            row = self._db.execute("SELECT email FROM server_tokens WHERE token_hash = ?", (_token_hash(token),)).fetchone()
+            if row is None:
+                return
+            self._db.execute("DELETE FROM server_tokens WHERE token_hash = ?", (_token_hash(token),))
+            self._db.execute("DELETE FROM server_tokens WHERE created < ?", (time.time() - self.token_ttl,))
+            if self._db.execute("SELECT 1 FROM server_tokens WHERE email = ?", row).fetchone() is None:
+                self._db.execute("DELETE FROM server_credentials WHERE email = ?", row)
+            self._db.commit()
+
+def load_key(path=KEY_PATH):
+    """
+    Clé Fernet depuis MYR5_SECRET_KEY, sinon depuis 'path' ; générée au premier lancement
+    et lisible par le seul propriétaire du fichier.
+    """
+    key = os.environ.get("MYR5_SECRET_KEY")
+    if key:
+        return key.encode()
+    try:
+        with open(path, "rb") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    key = base64.urlsafe_b64encode(os.urandom(32))
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(key)
+    return key
+
+def _token_hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def create_app(credentials=None, workers=WORKERS, access_key=None, client_factory=None):
+    """
+    API HTTP locale autour des gestionnaires de session :
+    POST /sessions {"email", "password"} -> {"token", "data"}, après une première récupération réussie
+    (avec 'access_key', la requête doit aussi porter l'en-tête "X-Access-Key: <clé>") ;
+    GET /data[?force_refresh=1] -> données du compte du jeton (en-tête "Authorization: Bearer <jeton>") ;
+    GET /telemetry/battery[?start=<ISO>] et GET /analytics -> relevés de batterie et agrégats de son véhicule ;
+    GET /assets/<n>[?width=<px>] -> vignette locale du n-ième visuel de son véhicule (404 tant qu'elle manque) ;
+    DELETE /sessions -> invalide le jeton ; GET /metrics et /metrics.json -> mesures du serveur.
+    Les récupérations passent par un pool de 'workers' threads : la charge sur l'API Renault dépend
+    du pool et non du nombre d'onglets ouverts. Les gestionnaires partagent cache, historiques et
+    couche de résilience (une même récupération demandée par plusieurs clients n'est faite qu'une fois).
+    """
+    credentials = credentials if credentials is not None else CredentialStore()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="myr5-worker")
+
+    async def in_pool(func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(executor, partial(func, *args, **kwargs))
+
+    def fetch_sync(email, password, force_refresh):
+        manager = get_session_manager(email, password, client_factory=client_factory)
+        return manager.get_data(force_refresh=force_refresh)
+
+    async def fetch(email, password, force_refresh):
+        with span("server.fetch"):
+            data = await in_pool(fetch_sync, email, password, force_refresh)
+        return payload_to_dict(data)
+
+    def authenticate(request):
+        header = request.headers.get("Authorization", "")
+        if not header.startswith("Bearer "):
+            raise web.HTTPUnauthorized(text="jeton manquant")
+        creds = credentials.resolve(header[len("Bearer "):])
+        if creds is None:
+            raise web.HTTPUnauthorized(text="jeton inconnu ou expiré")
+        return creds
+
+    async def login(request):
+        if access_key is not None and not hmac.compare_digest(request.headers.get("X-Access-Key", "").encode(), access_key.encode()):
+            raise web.HTTPForbidden(text="clé d'accès invalide")
+        try:
+            body = await request.json()
+            email, password = body["email"], body["password"]
+        except (ValueError, KeyError, TypeError):
+            raise web.HTTPBadRequest(text="email et password attendus")
+        try:
+            # identifiants non vérifiés : get_session_manager n'enregistre le gestionnaire qu'après une connexion réussie
+            with span("server.login"):
+                payload = await fetch(email, password, force_refresh=False)
+        except Exception as exc:
+            # identifiants refusés ou API injoignable : rien n'est enregistré
+            METRICS.error("server.login")
+            logger.warning("Connexion refusée pour %s (%s: %s)", email, type(exc).__name__, exc)
+            raise web.HTTPUnauthorized(text=f"{type(exc).__name__}: {exc}")
+        token = await asyncio.to_thread(credentials.add, email, password)
+        return web.json_response({"token": token, "data": payload})
+
+    async def logout(request):
+        header = request.headers.get("Authorization", "")
+        if header.startswith("Bearer "):
+            await asyncio.to_thread(credentials.revoke, header[len("Bearer "):])
+        return web.Response(status=204)
+
+    async def data(request):
+        email, password = await asyncio.to_thread(authenticate, request)
+        try:
+            payload = await fetch(email, password, force_refresh=request.query.get("force_refresh") == "1")
+        except Exception as exc:
+            METRICS.error("server.data")
+            raise web.HTTPBadGateway(text=f"{type(exc).__name__}: {exc}")
+        return web.json_response(payload)
+
+    def vin_of(email, password):
+        # le VIN est toujours celui du compte du jeton : les relevés d'un autre véhicule ne sont pas accessibles
+        manager = get_session_manager(email, password, client_factory=client_factory)
+        if manager.vin is None:
+            manager.get_data()
+        return manager.vin
+
+    def battery_sync(email, password, start):
+        telemetry = get_shared_telemetry().query("battery", vin_of(email, password), start=start)
+        telemetry.index = telemetry.index.strftime("%Y-%m-%dT%H:%M:%SZ")
+        return telemetry.reset_index().to_dict("list")
+
+    def analytics_sync(email, password):
+        vin = vin_of(email, password)
+        analytics = get_shared_analytics()
+        return {
+            "monthly": analytics.energy(vin, "month").reset_index().to_dict("list"),
+            "bands": analytics.power_bands(vin).reset_index().to_dict("list"),
+        }
+
+    async def battery(request):
+        email, password = await asyncio.to_thread(authenticate, request)
+        try:
+            start = parse_iso(request.query["start"]) if "start" in request.query else None
+        except ValueError:
+            raise web.HTTPBadRequest(text="start attendu au format ISO")
+        try:
+            return web.json_response(await in_pool(battery_sync, email, password, start))
+        except Exception as exc:
+            METRICS.error("server.telemetry")
+            raise web.HTTPBadGateway(text=f"{type(exc).__name__}: {exc}")
+
+    async def analytics(request):
+        email, password = await asyncio.to_thread(authenticate, request)
+        try:
+            return web.json_response(await in_pool(analytics_sync, email, password))
+        except Exception as exc:
+            METRICS.error("server.analytics")
+            raise web.HTTPBadGateway(text=f"{type(exc).__name__}: {exc}")
+
+    def thumbnail_sync(email, password, index, width):
+        manager = get_session_manager(email, password, client_factory=client_factory)
+        if manager.vehicle_link is None:
+            manager.get_data()
+        assets = manager.vehicle_link.raw_data["vehicleDetails"]["assets"]
+        if not 0 <= index < len(assets):
+            return None
+        return get_shared_asset_cache().image_for(assets[index], width)
+
+    async def thumbnail(request):
+        email, password = await asyncio.to_thread(authenticate, request)
+        try:
+            index = int(request.match_info["index"])
+            width = int(request.query.get("width", THUMBNAIL_WIDTH))
+        except ValueError:
+            raise web.HTTPBadRequest(text="index et width entiers attendus")
+        path = await in_pool(thumbnail_sync, email, password, index, width)
+        if path is None:
+            # pas encore téléchargée : le client affiche la plus petite rendition du CDN
+            raise web.HTTPNotFound(text="vignette indisponible")
+        return web.FileResponse(path, headers={"Cache-Control": "private, max-age=86400"})
+
+    async def metrics(request):
+        return web.Response(text=METRICS.render_prometheus(), content_type="text/plain")
+
+    async def metrics_json(request):
+        return web.json_response(METRICS.snapshot())
+
+    async def shutdown(app):
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    app = web.Application()
+    app.add_routes([
+        web.post("/sessions", login),
+        web.delete("/sessions", logout),
+        web.get("/data", data),
+        web.get("/telemetry/battery", battery),
+        web.get("/analytics", analytics),
+        web.get("/assets/{index}", thumbnail),
+        web.get("/metrics", metrics),
+        web.get("/metrics.json", metrics_json),
+    ])
+    app.on_cleanup.append(shutdown)
+    return app
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serveur partagé de récupération des données Renault pour plusieurs utilisateurs.")
+    parser.add_argument("--host", default="127.0.0.1", help="adresse d'écoute (derrière un proxy HTTPS si exposée)")
+    parser.add_argument("--port", type=int, default=8765, help="port d'écoute")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="récupérations menées en parallèle")
+    parser.add_argument("--access-key", default=os.environ.get("MYR5_ACCESS_KEY"),
+                        help="clé exigée pour ouvrir une session (MYR5_ACCESS_KEY par défaut)")
+    parser.add_argument("--log-level", default="INFO", help="niveau de journalisation")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    web.run_app(create_app(workers=args.workers, access_key=args.access_key), host=args.host, port=args.port)
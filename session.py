@@ -0,0 +1,241 @@
+import asyncio
+import functools
+import hmac
+import os
+import threading
+import time
+
+from renault_api.exceptions import NotAuthenticatedException
+
+from analytics import AnalyticsStore
+from assets import AssetCache
+from cache import TTLCache
+from charge_store import ChargeStore
+from main import discover_vehicle, collect_vehicle_data
+from metrics import span
+from reconstruction import GapReconstructor
+from resilience import Resilience, retry
+from telemetry import TelemetryStore
+
+LOGIN_TTL = 6 * 3600 # durée (en secondes) après laquelle on refait un login complet par précaution
+REQUEST_TIMEOUT = 120 # délai maximum d'attente d'une récupération depuis le thread appelant
+ASSETS_RETRY_INTERVAL = 300 # délai (en secondes) avant de retenter les visuels dont le téléchargement a échoué
+
+class RenaultSessionManager:
+    """
+    Session MyRenault persistante : une boucle asyncio dans un thread d'arrière-plan
+    garde la session HTTP, le token de connexion, le compte, le VIN et l'objet véhicule
+    d'un rafraîchissement à l'autre. Un rafraîchissement ne paie plus que les appels de données.
+    """
+
+    def __init__(self, email, password, login_ttl=LOGIN_TTL, cache=None, charge_store=None, telemetry=None,
+                 analytics=None, resilience=None, asset_cache=None, reconstructor=None, client_factory=None):
+        self.email = email
+        self._password = password
+        self.login_ttl = login_ttl
+        self.cache = cache if cache is not None else TTLCache()
+        self.charge_store = charge_store
+        self.telemetry = telemetry
+        self.analytics = analytics
+        self.resilience = resilience if resilience is not None else Resilience(fatal=(NotAuthenticatedException,))
+        self.asset_cache = asset_cache
+        self.reconstructor = reconstructor
+        self._assets_prefetch = None
+        self._assets_prefetch_at = None
+        self._client_factory = client_factory # ex. replay.FakeRenaultClient pour un rejeu hors ligne
+
+        self._websession = None
+        self._client = None
+        self._logged_in_at = None
+        self.account = None
+        self.vehicle_link = None
+        self.vehicle = None
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name=f"renault-session-{email}", daemon=True)
+        self._thread.start()
+        self._lock = None
+
+    @property
+    def vin(self):
+        return self.vehicle_link.vin if self.vehicle_link is not None else None
+
+    def run(self, coro, timeout=REQUEST_TIMEOUT):
+        """Exécute une coroutine dans la boucle de la session et attend son résultat."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    def login(self):
+        """Connexion et découverte du véhicule si nécessaire ; lève l'erreur si les identifiants sont refusés."""
+        self.run(self._call(_nothing))
+
+    def get_data(self, force_refresh=False):
+        """
+        Équivalent synchrone de get_renault_data, sans reconnexion ni redécouverte.
+        Les endpoints encore frais sont servis depuis le cache, sauf si force_refresh.
+        Avec un cache de visuels, les images manquantes sont téléchargées en arrière-plan.
+        """
+        data = self.run(self._call(lambda: collect_vehicle_data(
+            self.vehicle, self.vehicle_link, cache=self.cache, force_refresh=force_refresh,
+            charge_store=self.charge_store, telemetry=self.telemetry, analytics=self.analytics,
+            resilience=self.resilience, reconstructor=self.reconstructor,
+        )))
+        self._prefetch_assets(data.assets)
+        return data
+
+    def _prefetch_assets(self, assets):
+        # sans attendre : les vignettes locales remplacent les URL du CDN dès qu'elles sont prêtes ;
+        # les renditions encore absentes (CDN en erreur, timeout) sont redemandées après ASSETS_RETRY_INTERVAL
+        if self.asset_cache is None:
+            return
+        if self._assets_prefetch is not None and not self._assets_prefetch.done():
+            return
+        if self._assets_prefetch_at is not None and time.monotonic() - self._assets_prefetch_at < ASSETS_RETRY_INTERVAL:
+            return
+        if self.asset_cache.missing(assets):
+            self._assets_prefetch_at = time.monotonic()
+            self._assets_prefetch = asyncio.run_coroutine_threadsafe(self.asset_cache.prefetch(assets), self._loop)
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        self.run(self._close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _close(self):
+        if self._websession is not None:
+            await self._websession.close()
+        self._websession = None
+        self._client = None
+        self._logged_in_at = None
+
+    async def _login(self):
+        if self._client is None and self._client_factory is not None:
+            self._client = self._client_factory()
+        elif self._client is None:
+            import aiohttp
+            from renault_api.renault_client import RenaultClient
+
+            self._websession = aiohttp.ClientSession()
+            self._client = RenaultClient(websession=self._websession, locale="fr_FR")
+        with span("login"):
+            await self._client.session.login(self.email, self._password)
+        self._logged_in_at = time.monotonic()
+        # les objets compte/véhicule portent la session : on les redécouvre une fois
+        if self.vehicle is None:
+            with span("discovery"):
+                self.account, self.vehicle_link, self.vehicle = await retry(
+                    lambda: discover_vehicle(self._client), fatal=(NotAuthenticatedException,)
+                )
+
+    async def _call(self, make_coro):
+        """
+        Garantit une session valide puis exécute l'appel.
+        Le JWT est renouvelé automatiquement par renault_api ; si le token de connexion
+        a expiré, on se reconnecte une fois et on rejoue l'appel.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            expired = self._logged_in_at is None or time.monotonic() - self._logged_in_at > self.login_ttl
+            if expired or self.vehicle is None:
+                await self._login()
+        try:
+            return await make_coro()
+        except NotAuthenticatedException:
+            async with self._lock:
+                await self._login()
+            return await make_coro()
+
+async def _nothing():
+    return None
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+def _shared(factory):
+    """
+    Ressource créée au premier appel de la fonction décorée puis partagée par tous les gestionnaires.
+    Comme le registre, elle vit au niveau du module et survit aux réexécutions du script Streamlit.
+    """
+    instance = None
+    lock = threading.Lock()
+
+    @functools.wraps(factory)
+    def get():
+        nonlocal instance
+        with lock:
+            if instance is None:
+                instance = factory()
+            return instance
+    return get
+
+@_shared
+def get_shared_cache():
+    """Cache des réponses de l'API, persistant sur disque si MYR5_CACHE_PATH est défini."""
+    return TTLCache(path=os.environ.get("MYR5_CACHE_PATH"))
+
+@_shared
+def get_shared_charge_store():
+    return ChargeStore()
+
+@_shared
+def get_shared_telemetry():
+    return TelemetryStore()
+
+@_shared
+def get_shared_analytics():
+    return AnalyticsStore()
+
+@_shared
+def get_shared_resilience():
+    """Couche de résilience : les requêtes identiques de plusieurs pages sont regroupées."""
+    return Resilience(fatal=(NotAuthenticatedException,))
+
+@_shared
+def get_shared_asset_cache():
+    return AssetCache()
+
+@_shared
+def get_shared_reconstructor():
+    return GapReconstructor()
+
+def _new_manager(email, password, client_factory=None):
+    return RenaultSessionManager(email, password, cache=get_shared_cache(), charge_store=get_shared_charge_store(),
+                                 telemetry=get_shared_telemetry(), analytics=get_shared_analytics(),
+                                 resilience=get_shared_resilience(), asset_cache=get_shared_asset_cache(),
+                                 reconstructor=get_shared_reconstructor(), client_factory=client_factory)
+
+def get_session_manager(email, password, client_factory=None):
+    """
+    Retourne le gestionnaire de session associé à ces identifiants, en le créant au besoin.
+    Un nouveau gestionnaire n'est enregistré (et ne remplace celui d'un autre mot de passe) qu'après
+    une connexion réussie ; sinon il est fermé et l'erreur de connexion remonte sans toucher au registre.
+    Le registre vit au niveau du module et survit donc aux réexécutions du script Streamlit.
+    """
+    with _managers_lock:
+        manager = _managers.get(email)
+    if manager is not None and _same_password(manager, password):
+        return manager
+
+    candidate = _new_manager(email, password, client_factory)
+    try:
+        candidate.login()
+    except BaseException:
+        candidate.close()
+        raise
+    with _managers_lock:
+        manager = _managers.get(email)
+        if manager is not None and _same_password(manager, password):
+            # enregistré entre-temps par un autre appelant
+            replaced, manager = candidate, manager
+        else:
+            replaced, manager = manager, candidate
+            _managers[email] = candidate
+    if replaced is not None:
+        replaced.close()
+    return manager
+
+def _same_password(manager, password):
+    return hmac.compare_digest(manager._password.encode(), password.encode())
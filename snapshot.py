@@ -0,0 +1,38 @@
+import json
+import os
+import tempfile
+
+from storage import DATA_DIR
+
+SNAPSHOT_PATH = os.environ.get("MYR5_SNAPSHOT_PATH", os.path.join(DATA_DIR, "snapshot.json"))
+
+def write_snapshot(data, path=SNAPSHOT_PATH, meta=None):
+    """
+    Publie le dernier instantané de manière atomique : écriture dans un fichier temporaire
+    du même dossier puis renommage, un lecteur ne voit donc jamais de fichier à moitié écrit.
+    """
+    from models import payload_to_dict
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    payload = {"meta": meta or {}, "data": payload_to_dict(data)}
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def read_snapshot(path=SNAPSHOT_PATH):
+    """Retourne (VehicleData, meta) du dernier instantané publié, ou None s'il n'y en a pas."""
+    # import différé : pandas n'est chargé que lorsqu'il y a un instantané à lire
+    from models import payload_from_dict
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+    except FileNotFoundError:
+        return None
+    return payload_from_dict(payload["data"]), payload.get("meta", {})
@@ -0,0 +1,17 @@
+import os
+import sqlite3
+
+DATA_DIR = os.environ.get("MYR5_DATA_DIR", ".myr5") # dossier des données locales (historique, télémétrie, instantanés)
+DB_PATH = os.path.join(DATA_DIR, "myr5.sqlite")
+
+def connect(path=DB_PATH):
+    """
+    Ouvre la base SQLite locale (en créant son dossier au besoin).
+    La connexion est partagée entre threads : les appelants sérialisent leurs écritures.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    return db
@@ -0,0 +1,167 @@
+import math
+import threading
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from dates import parse_iso
+from storage import DB_PATH, connect
+
+# colonnes enregistrées pour chaque type de relevé ; la première est agrégée en min/max lors du sous-échantillonnage
+TABLES = {
+    "battery": ["battery_level", "battery_autonomy", "plug_status", "charging_status"],
+    "cockpit": ["mileage"],
+    "location": ["latitude", "longitude"],
+}
+MAX_POINTS = 500 # nombre de points au-delà duquel une série est sous-échantillonnée
+CHUNK_SIZE = 50_000 # relevés lus par requête lors d'un parcours complet
+
+class TelemetryStore:
+    """
+    Série temporelle locale des relevés batterie / cockpit / position.
+    Chaque relevé est indexé par (VIN, horodatage en secondes) : un même relevé remonté
+    plusieurs fois par l'API n'est enregistré qu'une fois. Les requêtes sur une plage longue
+    sont agrégées par SQLite (min/max/dernier par intervalle) plutôt que chargées en entier.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self._db = connect(path)
+        self._lock = threading.Lock()
+        for table, columns in TABLES.items():
+            self._db.execute(f"""
+                CREATE TABLE IF NOT EXISTS telemetry_{table} (
+                    vin TEXT NOT NULL,
+                    ts INTEGER NOT NULL,
+                    {", ".join(f"{c} REAL" for c in columns)},
+                    PRIMARY KEY (vin, ts)
+                ) WITHOUT ROWID
+            """)
+        self._db.commit()
+
+    def record(self, vin, battery=None, cockpit=None, location=None, fetched_at=None):
+        """
+        Enregistre les réponses brutes (raw_data) d'une récupération ; les endpoints absents sont ignorés.
+        Le kilométrage n'étant pas horodaté par l'API, il n'est enregistré que lorsqu'il change.
+        """
+        fetched_at = fetched_at or datetime.now(timezone.utc)
+        with self._lock:
+            if battery is not None and battery.get("timestamp") is not None:
+                self._insert("battery", vin, _epoch(battery["timestamp"]), [
+                    battery.get("batteryLevel"),
+                    battery.get("batteryAutonomy"),
+                    battery.get("plugStatus"),
+                    battery.get("chargingStatus"),
+                ])
+            if cockpit is not None:
+                mileage = cockpit["data"]["attributes"].get("totalMileage")
+                last = self._db.execute(
+                    "SELECT mileage FROM telemetry_cockpit WHERE vin = ? ORDER BY ts DESC LIMIT 1", (vin,)
+                ).fetchone()
+                if mileage is not None and (last is None or last[0] != mileage):
+                    self._insert("cockpit", vin, int(fetched_at.timestamp()), [mileage])
+            if location is not None:
+                attributes = location["data"]["attributes"]
+                ts = attributes.get("lastUpdateTime")
+                self._insert("location", vin, _epoch(ts) if ts else int(fetched_at.timestamp()), [
+                    attributes.get("gpsLatitude"),
+                    attributes.get("gpsLongitude"),
+                ])
+            self._db.commit()
+
+    def query(self, kind, vin, start=None, end=None, max_points=MAX_POINTS):
+        """
+        Relevés de type 'kind' pour ce VIN entre start et end (datetime, bornes optionnelles).
+        Au-delà de max_points relevés, les données sont agrégées par intervalles réguliers :
+        la première colonne donne <col>_min / <col>_max, toutes les colonnes leur dernière valeur.
+        Retourne un DataFrame indexé par la date (UTC).
+        """
+        columns = TABLES[kind]
+        table = f"telemetry_{kind}"
+        lo = int(start.timestamp()) if start is not None else 0
+        hi = int(end.timestamp()) if end is not None else 2**62
+        with self._lock:
+            count, first_ts, last_ts = self._db.execute(
+                f"SELECT COUNT(*), MIN(ts), MAX(ts) FROM {table} WHERE vin = ? AND ts >= ? AND ts <= ?", (vin, lo, hi)
+            ).fetchone()
+            if not count or not max_points or count <= max_points:
+                rows = self._db.execute(
+                    f"SELECT ts, {', '.join(columns)} FROM {table} WHERE vin = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+                    (vin, lo, hi),
+                ).fetchall()
+                names = ["ts", *columns]
+            else:
+                bucket = max(1, math.ceil((last_ts - first_ts + 1) / max_points))
+                if bucket > 60:
+                    bucket = 60 * math.ceil(bucket / 60) # intervalles en minutes entières
+                main_column = columns[0]
+                rows = self._db.execute(f"""
+                    SELECT g.bucket, g.lo, g.hi, {', '.join(f't.{c}' for c in columns)}
+                    FROM (
+                        SELECT ts / ? * ? AS bucket, MIN({main_column}) AS lo, MAX({main_column}) AS hi, MAX(ts) AS last_ts
+                        FROM {table} WHERE vin = ? AND ts >= ? AND ts <= ?
+                        GROUP BY bucket
+                    ) g
+                    JOIN {table} t ON t.vin = ? AND t.ts = g.last_ts
+                    ORDER BY g.bucket
+                """, (bucket, bucket, vin, lo, hi, vin)).fetchall()
+                names = ["ts", f"{main_column}_min", f"{main_column}_max", *columns]
+        df = pd.DataFrame(rows, columns=names)
+        df.index = pd.to_datetime(df.pop("ts"), unit="s", utc=True)
+        df.index.name = "time"
+        return df
+
+    def vins(self, kind):
+        with self._lock:
+            return [vin for (vin,) in self._db.execute(f"SELECT DISTINCT vin FROM telemetry_{kind} ORDER BY vin")]
+
+    def iter_chunks(self, kind, vin, start=None, end=None, chunk_size=CHUNK_SIZE):
+        """
+        Parcourt tous les relevés de type 'kind' du VIN (sans sous-échantillonnage) par morceaux de
+        'chunk_size' lignes. Chaque morceau est un DataFrame indexé par la date (UTC), comme query().
+        """
+        columns = TABLES[kind]
+        after = int(start.timestamp()) - 1 if start is not None else -1
+        hi = int(end.timestamp()) if end is not None else 2**62
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT ts, {', '.join(columns)} FROM telemetry_{kind} WHERE vin = ? AND ts > ? AND ts <= ? "
+                    f"ORDER BY ts LIMIT ?", (vin, after, hi, chunk_size)
+                ).fetchall()
+            if not rows:
+                return
+            df = pd.DataFrame(rows, columns=["ts", *columns])
+            df.index = pd.to_datetime(df.pop("ts"), unit="s", utc=True)
+            df.index.name = "time"
+            yield df
+            after = rows[-1][0]
+
+    def reading_at(self, kind, vin, when):
+        """
+        Dernier relevé de type 'kind' à la date 'when' (datetime), sinon le premier qui la suit.
+        Retourne (datetime UTC, {colonne: valeur}) ou None si aucun relevé pour ce VIN.
+        """
+        columns = TABLES[kind]
+        table = f"telemetry_{kind}"
+        ts = int(when.timestamp())
+        select = f"SELECT ts, {', '.join(columns)} FROM {table} WHERE vin = ?"
+        with self._lock:
+            row = self._db.execute(f"{select} AND ts <= ? ORDER BY ts DESC LIMIT 1", (vin, ts)).fetchone()
+            if row is None:
+                row = self._db.execute(f"{select} AND ts > ? ORDER BY ts LIMIT 1", (vin, ts)).fetchone()
+        if row is None:
+            return None
+        return datetime.fromtimestamp(row[0], timezone.utc), dict(zip(columns, row[1:]))
+
+    def last_reading_time(self, kind, vin):
+        """Date (datetime UTC) du relevé de type 'kind' le plus récent du VIN, ou None."""
+        with self._lock:
+            (ts,) = self._db.execute(f"SELECT MAX(ts) FROM telemetry_{kind} WHERE vin = ?", (vin,)).fetchone()
+        return datetime.fromtimestamp(ts, timezone.utc) if ts is not None else None
+
+    def _insert(self, kind, vin, ts, values):
+        placeholders = ", ".join("?" * (len(values) + 2))
+        self._db.execute(f"INSERT OR IGNORE INTO telemetry_{kind} VALUES ({placeholders})", (vin, ts, *values))
+
+def _epoch(date_str):
+    return int(parse_iso(str(date_str)).timestamp())
@@ -0,0 +1,68 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from analytics import AnalyticsStore
+from models import to_charge_frame
+
+def charge(start, energy, power=10.0, duration=60, fake=False):
+    return {
+        "chargeStartDate": start,
+        "chargeEndDate": start,
+        "chargeStartBatteryLevel": 40,
+        "chargeEndBatteryLevel": 60,
+        "chargeEnergyRecovered": energy,
+        "chargePercentRecovered": energy / 52 * 100,
+        "chargeDuration": duration,
+        "chargePower": power,
+        "fakeCharge": fake,
+    }
+
+def monthly(store):
+    return store.energy("VIN").to_dict("index")
+
+@pytest.fixture
+def store(tmp_path):
+    return AnalyticsStore(tmp_path / "myr5.sqlite")
+
+def test_update_adds_then_skips_unchanged_charges(store):
+    charges = to_charge_frame([
+        charge("2025-04-30T10:00:00Z", 10.0),
+        charge("2025-05-02T10:00:00Z", 20.0, power=2.3),
+    ])
+    assert store.update("VIN", charges) == 2
+    assert monthly(store) == {
+        "2025-04": {"energy": pytest.approx(10.0), "charges": 1},
+        "2025-05": {"energy": pytest.approx(20.0), "charges": 1},
+    }
+    assert store.update("VIN", charges) == 0
+    bands = store.power_bands("VIN")
+    assert bands["charges"].tolist() == [1, 1]
+    assert bands["energy"].tolist() == pytest.approx([20.0, 10.0])
+
+def test_update_replaces_a_modified_charge(store):
+    store.update("VIN", to_charge_frame([charge("2025-05-02T10:00:00Z", 20.0)]))
+    # charge en cours lors de la synchro précédente : même début, énergie finale plus élevée
+    assert store.update("VIN", to_charge_frame([charge("2025-05-02T10:00:00Z", 26.0)])) == 1
+    assert monthly(store) == {"2025-05": {"energy": pytest.approx(26.0), "charges": 1}}
+
+def test_update_since_removes_charges_missing_from_the_window(store):
+    store.update("VIN", to_charge_frame([
+        charge("2025-04-20T10:00:00Z", 10.0),
+        charge("2025-05-01T10:00:00Z", 15.0, duration=359, fake=True),
+        charge("2025-05-02T10:00:00Z", 20.0),
+    ]))
+    # la charge ajoutée est remplacée par celle reconstituée depuis la télémétrie
+    since = datetime(2025, 5, 1, tzinfo=timezone.utc)
+    changed = store.update("VIN", to_charge_frame([
+        charge("2025-05-01T18:00:00Z", 12.0, fake=True),
+        charge("2025-05-02T10:00:00Z", 20.0),
+    ]), since=since)
+    assert changed == 2
+    # la charge d'avril, hors de la fenêtre, reste comptée
+    assert monthly(store) == {
+        "2025-04": {"energy": pytest.approx(10.0), "charges": 1},
+        "2025-05": {"energy": pytest.approx(32.0), "charges": 2},
+    }
+    assert store.update("OTHER", to_charge_frame([]), since=since) == 0
+    assert not store.has_charges("OTHER")
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+
+from charge_store import INITIAL_SYNC_DAYS, SYNC_OVERLAP, ChargeStore
+
+NOW = datetime(2025, 6, 1, 12, 0, tzinfo=timezone.utc)
+
+def charge(start, end, end_level=80, energy=10.0):
+    return {
+        "chargeStartDate": start,
+        "chargeEndDate": end,
+        "chargeStartBatteryLevel": 40,
+        "chargeEndBatteryLevel": end_level,
+        "chargeEnergyRecovered": energy,
+        "chargeDuration": 60,
+    }
+
+def test_merge_deduplicates_by_start_date(tmp_path):
+    store = ChargeStore(tmp_path / "myr5.sqlite")
+    first = charge("2025-05-01T10:00:00Z", "2025-05-01T11:00:00Z")
+    second = charge("2025-05-03T10:00:00Z", "2025-05-03T10:30:00Z", end_level=60)
+    assert store.merge("VIN", [first, second]) == 2
+
+    # la charge en cours lors de la synchro précédente revient terminée : remplacée, pas dupliquée
+    finished = charge("2025-05-03T10:00:00Z", "2025-05-03T12:00:00Z", end_level=95)
+    assert store.merge("VIN", [second | finished, first]) == 0
+    assert store.load("VIN") == [first, finished]
+    # un autre VIN a son propre historique
+    assert store.merge("OTHER", [first]) == 1
+    assert store.load("VIN", start="2025-05-02T00:00:00Z") == [finished]
+
+def test_sync_window_requests_only_the_delta(tmp_path):
+    store = ChargeStore(tmp_path / "myr5.sqlite")
+    assert store.sync_window("VIN", NOW) == (NOW - timedelta(days=INITIAL_SYNC_DAYS), NOW)
+
+    store.merge("VIN", [
+        charge("2025-05-20T08:00:00Z", "2025-05-20T09:00:00Z"),
+        charge("2025-05-28T22:00:00Z", "2025-05-29T06:00:00Z"),
+    ])
+    last_end = datetime(2025, 5, 29, 6, 0, tzinfo=timezone.utc)
+    assert store.last_end_date("VIN") == last_end
+    assert store.sync_window("VIN", NOW) == (last_end - SYNC_OVERLAP, NOW)
+
+def test_end_before_skips_charges_without_energy(tmp_path):
+    store = ChargeStore(tmp_path / "myr5.sqlite")
+    store.merge("VIN", [
+        charge("2025-05-01T10:00:00Z", "2025-05-01T11:00:00Z", end_level=70),
+        charge("2025-05-02T10:00:00Z", "2025-05-02T11:00:00Z", end_level=90, energy=0),
+        charge("2025-05-03T10:00:00Z", "2025-05-03T11:00:00Z", end_level=85),
+    ])
+    assert store.end_before("VIN", "2025-05-03T10:00:00Z") == (70, "2025-05-01T11:00:00Z")
+    assert store.end_before("VIN", "2025-05-01T10:00:00Z") == (None, None)
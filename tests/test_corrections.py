@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+from corrections import CHARGE_COLUMNS, correct_charges, correct_charges_reference
+from models import CHARGE_DTYPES, to_charge_frame
+from replay import synthetic_charges
+
+def reference_frame(charges):
+    return to_charge_frame(correct_charges_reference(charges))
+
+def assert_same(result, expected):
+    assert list(result.columns) == CHARGE_COLUMNS
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True))
+
+def charge(start, end_level, start_level=20, energy=10.0, duration=60, end=None):
+    return {
+        "chargeStartDate": start,
+        "chargeEndDate": end or start,
+        "chargeStartBatteryLevel": start_level,
+        "chargeEndBatteryLevel": end_level,
+        "chargeEnergyRecovered": energy,
+        "chargeDuration": duration,
+    }
+
+@pytest.mark.parametrize("n, seed", [(1, 0), (50, 1), (500, 2), (2_000, 3)])
+def test_synthetic_histories(n, seed):
+    charges = synthetic_charges(n, seed=seed)
+    assert_same(correct_charges(charges), reference_frame(charges))
+
+def test_empty():
+    result = correct_charges([])
+    assert result.empty
+    assert list(result.columns) == CHARGE_COLUMNS
+    assert result.dtypes.to_dict() == CHARGE_DTYPES
+    assert correct_charges_reference([]) == []
+
+def test_all_zero_energy():
+    charges = [charge(f"2025-01-0{i}T10:00:00Z", 80, energy=0) for i in range(1, 6)]
+    result = correct_charges(charges)
+    assert result.empty
+    assert list(result.columns) == CHARGE_COLUMNS
+    assert correct_charges_reference(charges) == []
+
+def test_mixed_iso_formats():
+    # même jour, formats différents : l'ordre doit suivre l'instant réel, pas la chaîne
+    charges = [
+        charge("2025-03-01T12:00:00+01:00", 60, start_level=40),
+        charge("2025-03-01T10:30:00Z", 50, start_level=30),
+        charge("2025-03-01T09:00:00.250Z", 45, start_level=0),
+        charge("2025-03-02T08:00:00+00:00", 90, start_level=70, duration=0),
+    ]
+    assert_same(correct_charges(charges), reference_frame(charges))
+
+@pytest.mark.parametrize("split", [1, 37, 250, 499])
+def test_previous_end_level_matches_full_history(split):
+    charges = synthetic_charges(500, seed=4)
+    head, tail = charges[:split], charges[split:]
+    corrected_head = correct_charges(head)
+    previous_end_level = corrected_head["chargeEndBatteryLevel"].iloc[-1] if not corrected_head.empty else None
+
+    expected = reference_frame(charges)
+    # les lignes de la fin de l'historique, y compris la charge ajoutée qui précéderait la première
+    expected = expected.iloc[len(corrected_head):]
+    assert_same(correct_charges(tail, previous_end_level=previous_end_level), expected)
@@ -0,0 +1,73 @@
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+from charge_store import ChargeStore
+from corrections import correct_charges
+from export import iter_charge_frames, write_frames
+from reconstruction import GapReconstructor
+from replay import synthetic_charges
+from telemetry import TelemetryStore
+
+VINS = ["VIN1", "VIN2"]
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "myr5.sqlite")
+
+@pytest.fixture
+def store(db):
+    store = ChargeStore(db)
+    for seed, vin in enumerate(VINS):
+        store.merge(vin, synthetic_charges(300, seed=seed + 1))
+    return store
+
+def full_history(store, vin):
+    frame = correct_charges(store.load(vin))
+    frame.insert(0, "vin", vin)
+    return frame
+
+def exported(frames):
+    return pd.concat(list(frames), ignore_index=True)
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 10_000])
+def test_chunked_export_equals_full_history(store, chunk_size):
+    expected = pd.concat([full_history(store, vin) for vin in VINS], ignore_index=True)
+    assert expected["fakeCharge"].any()
+    pd.testing.assert_frame_equal(exported(iter_charge_frames(store, VINS, chunk_size=chunk_size)), expected)
+
+def test_export_from_start_keeps_the_missing_charge_at_the_boundary(store):
+    full = full_history(store, "VIN1")
+    # première charge réelle révélant une recharge manquante : l'export démarre à sa date
+    first = full.index[~full["fakeCharge"] & full["fakeCharge"].shift(fill_value=False)][0]
+    start = full["chargeStartDate"].iat[first].to_pydatetime()
+    result = exported(iter_charge_frames(store, ["VIN1"], start=start, chunk_size=16))
+    pd.testing.assert_frame_equal(result, full.iloc[first - 1:].reset_index(drop=True))
+
+def test_chunked_export_with_reconstruction_matches_the_dashboard(db, store):
+    telemetry = TelemetryStore(db)
+    full = full_history(store, "VIN1")
+    # relevés d'une charge branchée au milieu de chaque trou
+    for i in full.index[full["fakeCharge"]]:
+        middle = full["chargeEndDate"].iat[i - 1] + (full["chargeStartDate"].iat[i + 1] - full["chargeEndDate"].iat[i - 1]) / 2
+        for step, level in enumerate([full["chargeEndBatteryLevel"].iat[i - 1], full["chargeStartBatteryLevel"].iat[i + 1]]):
+            telemetry.record("VIN1", battery={
+                "timestamp": (middle + timedelta(hours=step)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "batteryLevel": int(level),
+                "plugStatus": 1,
+            })
+    dashboard = GapReconstructor(db).reconstruct("VIN1", full.drop(columns="vin"), telemetry)
+    dashboard.insert(0, "vin", "VIN1")
+    assert not dashboard["chargeStartDate"].equals(full["chargeStartDate"])
+    result = exported(iter_charge_frames(store, ["VIN1"], chunk_size=9, reconstructor=GapReconstructor(db), telemetry=telemetry))
+    pd.testing.assert_frame_equal(result, dashboard)
+
+def test_text_formats_export_the_same_values(tmp_path, store):
+    frame = full_history(store, "VIN1")
+    write_frames([frame], tmp_path / "charges.csv", "csv")
+    write_frames([frame], tmp_path / "charges.jsonl", "jsonl")
+    from_csv = pd.read_csv(tmp_path / "charges.csv")
+    from_jsonl = pd.read_json(tmp_path / "charges.jsonl", lines=True, convert_dates=False, precise_float=True)
+    for column in ["chargeEnergyRecovered", "chargePercentRecovered", "chargePower"]:
+        assert from_csv[column].tolist() == from_jsonl[column].tolist()
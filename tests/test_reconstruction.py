@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+
+from corrections import correct_charges
+from models import CHARGE_DTYPES
+from reconstruction import GapReconstructor
+from telemetry import TelemetryStore
+
+VIN = "VIN"
+
+def charge(start, end, start_level, end_level):
+    return {
+        "chargeStartDate": start,
+        "chargeEndDate": end,
+        "chargeStartBatteryLevel": start_level,
+        "chargeEndBatteryLevel": end_level,
+        "chargeEnergyRecovered": (end_level - start_level) / 100 * 52,
+        "chargeDuration": 60,
+    }
+
+# la seconde charge démarre à 70 % alors que la première s'est terminée à 50 % : une charge manque
+HISTORY = [
+    charge("2025-01-01T10:00:00Z", "2025-01-01T11:00:00Z", 20, 50),
+    charge("2025-01-05T10:00:00Z", "2025-01-05T11:00:00Z", 70, 90),
+]
+
+def record(telemetry, readings):
+    for timestamp, level, plug_status in readings:
+        telemetry.record(VIN, battery={"timestamp": timestamp, "batteryLevel": level, "plugStatus": plug_status})
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "myr5.sqlite")
+
+def test_gap_with_telemetry_is_replaced_by_the_observed_charge(db):
+    telemetry = TelemetryStore(db)
+    record(telemetry, [
+        ("2025-01-02T07:00:00Z", 48, 0),
+        ("2025-01-02T08:00:00Z", 45, 1),
+        ("2025-01-02T09:00:00Z", 55, 1),
+        ("2025-01-02T10:00:00Z", 65, 1),
+        ("2025-01-02T11:00:00Z", 65, 1),
+        ("2025-01-03T10:00:00Z", 60, 0),
+    ])
+    charges = correct_charges(HISTORY)
+    assert charges["fakeCharge"].tolist() == [False, True, False]
+
+    result = GapReconstructor(db).reconstruct(VIN, charges, telemetry)
+    assert result.dtypes.to_dict() == CHARGE_DTYPES
+    assert result["fakeCharge"].tolist() == [False, True, False]
+    found = result.iloc[1]
+    assert found["chargeStartDate"] == pd.Timestamp("2025-01-02T08:00:00Z")
+    assert found["chargeEndDate"] == pd.Timestamp("2025-01-02T10:00:00Z")
+    assert (found["chargeStartBatteryLevel"], found["chargeEndBatteryLevel"]) == (45, 65)
+    assert found["chargeDuration"] == 120
+    assert found["chargeEnergyRecovered"] == pytest.approx(20 / 100 * 52)
+    # le résultat est mémorisé : un nouveau reconstructeur le relit sans interroger la télémétrie
+    assert GapReconstructor(db).reconstruct(VIN, charges, None).equals(result)
+
+def test_rise_while_unplugged_is_not_a_charge(db):
+    telemetry = TelemetryStore(db)
+    record(telemetry, [
+        ("2025-01-02T08:00:00Z", 45, 0),
+        ("2025-01-02T09:00:00Z", 60, 0),
+        ("2025-01-06T08:00:00Z", 85, 0),
+    ])
+    charges = correct_charges(HISTORY)
+    pd.testing.assert_frame_equal(GapReconstructor(db).reconstruct(VIN, charges, telemetry), charges)
+
+def test_gap_without_readings_yet_is_analysed_again(db):
+    telemetry = TelemetryStore(db)
+    charges = correct_charges(HISTORY)
+    reconstructor = GapReconstructor(db)
+    pd.testing.assert_frame_equal(reconstructor.reconstruct(VIN, charges, telemetry), charges)
+
+    # les relevés de la période arrivent après la première analyse
+    record(telemetry, [
+        ("2025-01-03T08:00:00Z", 50, 1),
+        ("2025-01-03T09:00:00Z", 68, 1),
+    ])
+    result = reconstructor.reconstruct(VIN, charges, telemetry)
+    assert result.iloc[1]["chargeStartDate"] == pd.Timestamp("2025-01-03T08:00:00Z")
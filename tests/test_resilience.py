@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from resilience import CircuitBreaker, Resilience
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class Fatal(Exception):
+    pass
+
+def make_resilience(clock):
+    resilience = Resilience(attempts=1, failure_threshold=1, reset_timeout=10, fatal=(Fatal,))
+    resilience._breakers[("VIN", "battery")] = CircuitBreaker(1, 10, clock=clock)
+    return resilience
+
+KEY = ("VIN", "battery", ())
+
+def test_fatal_trial_releases_half_open_slot():
+    clock = Clock()
+    resilience = make_resilience(clock)
+    breaker = resilience.breaker("VIN", "battery")
+
+    async def ok():
+        return "ok"
+
+    async def down():
+        raise ConnectionError("API indisponible")
+
+    async def expired():
+        raise Fatal("token expiré")
+
+    async def scenario():
+        assert await resilience.call(KEY, ok) == ("ok", None)
+        value, stale_since = await resilience.call(KEY, down)
+        assert value == "ok" and stale_since is not None
+        assert breaker.state == "open"
+
+        clock.now = 11
+        assert breaker.state == "half_open"
+        with pytest.raises(Fatal):
+            await resilience.call(KEY, expired)
+        # l'essai n'a pas conclu : un nouvel appel doit pouvoir le refaire
+        assert breaker.state == "half_open"
+        assert await resilience.call(KEY, ok) == ("ok", None)
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+def test_cancelled_trial_releases_half_open_slot():
+    clock = Clock()
+    resilience = make_resilience(clock)
+    breaker = resilience.breaker("VIN", "battery")
+    breaker.record_failure()
+    clock.now = 11
+
+    async def slow():
+        await asyncio.sleep(60)
+
+    async def ok():
+        return "ok"
+
+    async def scenario():
+        task = asyncio.create_task(resilience.call(KEY, slow))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert await resilience.call(KEY, ok) == ("ok", None)
+
+    asyncio.run(scenario())
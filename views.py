@@ -0,0 +1,109 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from dates import format_dates
+
+PAGE_SIZE = 50 # lignes de charges affichées (et formatées) par page du tableau
+
+FAKE_LABEL = " <span title=\"Ajout magique d'une charge manquante dans l'API\">✨</span>"
+
+def charges_totals(charges):
+    """Totaux de l'historique calculés sur les colonnes numériques (énergie en kWh, pourcentage, durée en h, puissance en kW)."""
+    energy = float(charges['chargeEnergyRecovered'].to_numpy().sum(dtype='float64'))
+    percent = float(charges['chargePercentRecovered'].to_numpy().sum(dtype='float64'))
+    duration = float(charges['chargeDuration'].to_numpy().sum(dtype='int64')) / 60
+    return {
+        "energy": energy,
+        "percent": percent,
+        "duration": duration,
+        "power": energy / duration if duration else 0.0,
+    }
+
+def page_count(charges, page_size=PAGE_SIZE):
+    return max(1, math.ceil(len(charges) / page_size))
+
+def build_charges_table(charges, page=0, page_size=PAGE_SIZE):
+    """
+    Prépare le tableau HTML de l'onglet "Recharges" à partir de l'historique typé :
+    ligne TOTAL (sur tout l'historique) en tête, puis la page 'page' des charges, de la plus récente
+    à la plus ancienne, avec leur numéro. Seules les lignes de la page sont formatées.
+    """
+    n = len(charges)
+    totals = charges_totals(charges)
+
+    # Tri décroissant par date de début, puis découpage de la page demandée
+    order = np.argsort(charges['chargeStartDate'].to_numpy(), kind='stable')[::-1]
+    positions = np.arange(page * page_size, min((page + 1) * page_size, n))
+    charges_df = charges.iloc[order[positions]]
+
+    # Pour le tableau, on affiche les colonnes formatées avec leurs unités
+    display_df = pd.DataFrame({
+        # dates à l'heure de Paris en DD/MM/YYYY HH:MM:SS (une opération par colonne)
+        'Début charge': format_dates(charges_df['chargeStartDate']),
+        'Fin charge': format_dates(charges_df['chargeEndDate']),
+        'Niveau batterie début': charges_df['chargeStartBatteryLevel'].astype(str) + " %",
+        'Niveau batterie fin': charges_df['chargeEndBatteryLevel'].astype(str) + " %",
+        'Énergie rechargée (kWh)': charges_df['chargeEnergyRecovered'].round(2).astype(str) + " kWh",
+        'Pourcentage récupéré': charges_df['chargePercentRecovered'].round(2).astype(str) + " %",
+        # durée de recharge convertie en heures
+        'Durée de charge (h)': (charges_df['chargeDuration'] / 60).round(2).astype(str) + " h",
+        'Puissance de charge (kW)': charges_df['chargePower'].round(2).astype(str) + " kW",
+    })
+
+    # Ligne TOTAL, en gras
+    total_row = {
+        'Début charge': 'TOTAL',
+        'Fin charge': '',
+        'Niveau batterie début': '',
+        'Niveau batterie fin': '',
+        'Énergie rechargée (kWh)': f'{totals["energy"]:.2f} kWh',
+        'Pourcentage récupéré': f'{totals["percent"]:.2f} %',
+        'Durée de charge (h)': f'{totals["duration"]:.2f} h',
+        'Puissance de charge (kW)': f'{totals["power"]:.2f} kW'
+    }
+    total_row = {column: f"<b>{value}</b>" for column, value in total_row.items()}
+
+    # Numérotation décroissante des lignes, avec une icône pour les charges ajoutées
+    labels = (n - positions).astype(str).astype(object)
+    labels = np.where(charges_df['fakeCharge'].to_numpy(), labels + FAKE_LABEL, labels)
+
+    display_df_total = pd.concat([pd.DataFrame([total_row]), display_df], ignore_index=True)
+    display_df_total.index = ['TOTAL', *labels]
+
+    return display_df_total
+
+def battery_curve(charges):
+    """Points (début et fin de chaque charge) de la courbe d'évolution du niveau de batterie."""
+    # début puis fin de chaque charge, entrelacés
+    times = np.column_stack([
+        charges['chargeStartDate'].to_numpy(dtype='datetime64[ns]'),
+        charges['chargeEndDate'].to_numpy(dtype='datetime64[ns]'),
+    ]).ravel()
+    levels = np.column_stack([
+        charges['chargeStartBatteryLevel'].to_numpy(),
+        charges['chargeEndBatteryLevel'].to_numpy(),
+    ]).ravel()
+
+    # Indexer sur le temps
+    return pd.DataFrame({'level': levels}, index=pd.DatetimeIndex(times, name='time').tz_localize('UTC'))
+
+def battery_chart(charges, telemetry=None):
+    """
+    Séries de la courbe "Évolution du niveau de batterie" : les niveaux de début et de fin de charge
+    sur tout l'historique, et par-dessus les relevés de télémétrie sur la période qu'ils couvrent
+    (avec leurs min/max quand SQLite les a sous-échantillonnés).
+    """
+    chart = battery_curve(charges).rename(columns={'level': 'Charges'}).astype('float64')
+    if telemetry is None or telemetry.empty:
+        return chart
+    readings = telemetry[[c for c in ('battery_level', 'battery_level_min', 'battery_level_max') if c in telemetry]]
+    readings = readings.rename(columns={
+        'battery_level': 'Relevés',
+        'battery_level_min': 'Relevés (min)',
+        'battery_level_max': 'Relevés (max)',
+    })
+    chart = pd.concat([chart, readings]).sort_index(kind='stable')
+    # chaque série n'a de valeurs qu'à ses propres dates : on relie ses points sans la prolonger
+    return chart.interpolate(method='time', limit_area='inside')